@@ -0,0 +1,372 @@
+"""
+End-to-end throughput of the book builders against a local stand-in for Blogger.
+
+A synthetic blog is built from the posts of a Blogger export, replicated up to each
+corpus size. A local HTTP server (in its own process) serves the post pages, the images
+and a fake map page, with configurable latency and payload sizes, so no request leaves
+the machine and no browser is needed. Timed, per corpus size:
+
+    process_blog_post   every post rendered into one document, one call at a time
+    book                create_travel_blog_docx
+    split               create_travel_blog_docx_split
+    atom                extract_blogs.create_docx_from_backup on a synthetic export
+                        (its images point at the stand-in, which that script does not download)
+
+Every scenario starts from empty caches. Results are written as JSON; pass an earlier
+result file to --compare to print the change per scenario.
+
+    python benchmarks/bench_pipeline.py --sizes 5 20 60 --latency-ms 50 --json results.json
+"""
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import quote, urlparse
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+import extract_blogs  # noqa: E402
+from extract_blog_entries import TravelBlogExtractor  # noqa: E402
+from map_capture import MapCapturePool  # noqa: E402
+
+SCENARIOS = ('process_blog_post', 'book', 'split', 'atom')
+DISTINCT_IMAGES = 8  # images served are picked from this many pre-generated ones
+# stands for the server address in the corpus until the server has picked its port
+BASE_URL = 'http://stand-in.invalid'
+
+
+def load_posts(backup_file):
+    """(title, content) of every post in a Blogger export."""
+    return [(entry['title'], entry['content'])
+            for entry in extract_blogs.iter_entries(backup_file, blog_id_prefix=None, title_prefix=None)
+            if entry['kind'] == 'post' and entry['content'] != 'No Content']
+
+
+def build_corpus(posts, size, base_url=BASE_URL):
+    """
+    Replicates posts up to size, pointing every image at the stand-in server
+    (a distinct URL per post and image, as on a real blog). Map embeds are kept.
+
+    :return: List of dicts with slug, title and content.
+    """
+    corpus = []
+    for index in range(size):
+        title, content = posts[index % len(posts)]
+        if index >= len(posts):
+            title = f"{title} ({index // len(posts) + 1})"
+        body = BeautifulSoup(content, 'html.parser')
+        for number, img in enumerate(body.find_all('img')):
+            img['src'] = f"{base_url}/img/{index}/{number}.jpg"
+        for link in body.find_all('a'):
+            if link.find('img') is not None:
+                link['href'] = f"{base_url}/img/{index}/full.jpg"
+        corpus.append({'slug': f"{index:04}-post", 'title': title, 'content': str(body)})
+    return corpus
+
+
+def make_images(image_px, quality=90):
+    """Noisy photo-like JPEGs, so that size and decode cost are realistic."""
+    rng = random.Random(0)
+    images = []
+    for _ in range(DISTINCT_IMAGES):
+        small = Image.new('RGB', (64, 48))
+        small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(64 * 48)])
+        image = small.resize((image_px, image_px * 3 // 4), Image.BICUBIC)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=quality)
+        images.append(buffer.getvalue())
+    return images
+
+
+def make_map_png():
+    """A full-window screenshot of a map: land, water, roads and labels on a blank page."""
+    rng = random.Random(1)
+    # drawn at twice the size and scaled down, for the anti-aliased edges of a rendered map
+    image = Image.new('RGB', (2560, 1920), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((80, 80, 2480, 1840), fill=(170, 211, 223))
+    for _ in range(40):
+        x, y = rng.randrange(80, 2400), rng.randrange(80, 1760)
+        draw.ellipse((x, y, x + rng.randrange(120, 600), y + rng.randrange(120, 600)), fill=(232, 234, 214))
+    for _ in range(120):
+        points = [(rng.randrange(80, 2480), rng.randrange(80, 1840)) for _ in range(3)]
+        draw.line(points, fill=rng.choice([(255, 255, 255), (253, 226, 147), (180, 180, 180)]),
+                  width=rng.randrange(2, 10))
+    for _ in range(80):
+        draw.text((rng.randrange(80, 2400), rng.randrange(80, 1800)), f"Place {rng.randrange(1000)}",
+                  fill=(60, 60, 60), font_size=24)
+    buffer = BytesIO()
+    image.resize((1280, 960), Image.LANCZOS).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def serve(corpus, latency_ms, map_latency_ms, image_px, page_kb, ready):
+    """Runs the stand-in server; meant for a separate process so it does not compete for the GIL."""
+    pages = {}
+    filler = "<p>" + "lorem ipsum " * 80 + "</p>"
+    for post in corpus:
+        sidebar = filler * max(0, page_kb * 1024 // len(filler))
+        pages[f"/posts/{post['slug']}.html"] = (
+            f"<html><head><title>Travel diaries: {escape(post['title'])}</title></head><body>"
+            f"<div class='sidebar'>{sidebar}</div>"
+            f"<div class='post-body'>{post['content']}</div></body></html>").encode('utf-8')
+    images = make_images(image_px)
+    map_png = make_map_png()
+    stats = {'requests': 0, 'bytes': 0}
+    stats_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/__stats':
+                with stats_lock:
+                    return self.reply(200, 'application/json', json.dumps(stats).encode())
+            if path == '/__reset':
+                with stats_lock:
+                    stats.update(requests=0, bytes=0)
+                return self.reply(200, 'text/plain', b'ok')
+
+            if path.startswith('/map'):
+                time.sleep(map_latency_ms / 1000)  # stands in for the browser rendering the map
+                status, content_type, body = 200, 'image/png', map_png
+            else:
+                time.sleep(latency_ms / 1000)
+                if path in pages:
+                    status, content_type, body = 200, 'text/html; charset=utf-8', pages[path]
+                elif path.startswith('/img/'):
+                    digest = hashlib.sha256(path.encode()).digest()
+                    status, content_type, body = 200, 'image/jpeg', images[digest[0] % len(images)]
+                else:
+                    status, content_type, body = 404, 'text/plain', b'not found'
+            with stats_lock:
+                stats['requests'] += 1
+                stats['bytes'] += len(body)
+            self.reply(status, content_type, body)
+
+        def reply(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    for path, page in pages.items():
+        pages[path] = page.replace(BASE_URL.encode(), base_url.encode())
+    ready.put(base_url)
+    server.serve_forever()
+
+
+class LocalMapPool(MapCapturePool):
+    """
+    MapCapturePool whose screenshots come from the stand-in server instead of a browser.
+    Passed to the extractor as map_pool_factory, so render worker processes use it too.
+    """
+
+    def __init__(self, base_url, **options):
+        super().__init__(**options)
+        self.session = requests.Session()
+        self.base_url = base_url
+
+    def render(self, map_src):
+        response = self.session.get(f"{self.base_url}/map?src={quote(map_src, safe='')}", timeout=30)
+        return response.content if response.status_code == 200 else None
+
+    def close(self):
+        self.session.close()
+
+
+def make_extractor(work_dir, base_url, options):
+    config_file = os.path.join(work_dir, 'config.json')
+    with open(config_file, 'w') as f:
+        json.dump({'BLOGGER_API_KEY': '', 'TRAVEL_BLOG_ID': ''}, f)
+    extractor = TravelBlogExtractor(config_file=config_file,
+                                    cache_dir=os.path.join(work_dir, 'http_cache'),
+                                    map_cache_dir=None,
+                                    ir_cache_dir=os.path.join(work_dir, 'post_ir'),
+                                    post_store_file=os.path.join(work_dir, 'posts.sqlite3'),
+                                    metrics_file=os.path.join(work_dir, 'metrics.jsonl'),
+                                    incremental=False,
+                                    chunk_size=options.chunk_size,
+                                    render_workers=options.render_workers,
+                                    map_pool_factory=functools.partial(LocalMapPool, base_url))
+    return extractor
+
+
+def write_atom(corpus, path):
+    """A minimal Blogger export holding the corpus."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<feed xmlns='http://www.w3.org/2005/Atom'>\n")
+        for index, post in enumerate(corpus):
+            f.write(f"<entry><id>tag:blogger.com,1999:blog-1.post-{index}</id>"
+                    f"<published>2024-07-01T00:00:00.000+01:00</published>"
+                    f"<category scheme='http://schemas.google.com/g/2005#kind' "
+                    f"term='http://schemas.google.com/blogger/2008/kind#post'/>"
+                    f"<title type='text'>{escape(post['title'])}</title>"
+                    f"<content type='html'>{escape(post['content'])}</content>"
+                    f"<author><name>Bench</name></author></entry>\n")
+        f.write("</feed>\n")
+
+
+def run_scenario(name, corpus, base_url, options):
+    """Runs one scenario in a fresh working directory and returns its wall time in seconds."""
+    work_dir = tempfile.mkdtemp(prefix='ghost_writer_bench_')
+    try:
+        urls = [f"{base_url}/posts/{post['slug']}.html" for post in corpus]
+        url_file = os.path.join(work_dir, 'urls.txt')
+        with open(url_file, 'w', encoding='utf-8') as f:
+            f.writelines(url + '\n' for url in urls)
+
+        if name == 'atom':
+            xml_file = os.path.join(work_dir, 'export.xml')
+            write_atom(corpus, xml_file)
+            start = time.perf_counter()
+            extract_blogs.create_docx_from_backup(xml_file, os.path.join(work_dir, 'atom.docx'),
+                                                  blog_id_prefix=None, title_prefix=None)
+            return time.perf_counter() - start
+
+        extractor = make_extractor(work_dir, base_url, options)
+        try:
+            start = time.perf_counter()
+            if name == 'process_blog_post':
+                doc = extractor.new_document(os.path.join(work_dir, 'process_blog_post.docx'))
+                for url in urls:
+                    extractor.process_blog_post(doc, url)
+            elif name == 'book':
+                extractor.create_travel_blog_docx(os.path.join(work_dir, 'book.docx'), url_file)
+            elif name == 'split':
+                extractor.create_travel_blog_docx_split(work_dir, url_file)
+            return time.perf_counter() - start
+        finally:
+            extractor.close_session()
+            extractor.close_driver()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def server_stats(session, base_url, reset=False):
+    return session.get(f"{base_url}/{'__reset' if reset else '__stats'}", timeout=10)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r['scenario'], r['posts']): r for r in json.load(f)['results']}
+    print(f"\ncompared with {baseline_file}")
+    print(f"{'scenario':<18} {'posts':>6} {'before s':>9} {'after s':>9} {'change':>8}")
+    for result in results:
+        before = baseline.get((result['scenario'], result['posts']))
+        if before:
+            change = result['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+            print(f"{result['scenario']:<18} {result['posts']:>6} {before['seconds']:>9.2f} "
+                  f"{result['seconds']:>9.2f} {change:>+8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backup', default=os.path.join(ROOT, 'blog_backup', 'blog-01-11-2025.xml'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 20, 60], help='corpus sizes (posts)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=1, help='runs per scenario; the median is reported')
+    parser.add_argument('--latency-ms', type=float, default=50, help='delay before every page and image response')
+    parser.add_argument('--map-latency-ms', type=float, default=500, help='delay of every map capture')
+    parser.add_argument('--image-px', type=int, default=1600, help='width of the images served')
+    parser.add_argument('--page-kb', type=int, default=100, help='extra markup around every post page')
+    parser.add_argument('--chunk-size', type=int, default=1, help='posts per file in the split scenario')
+    parser.add_argument('--render-workers', type=int, default=1, help='render processes in the split scenario')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='earlier --json output to compare against')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    posts = load_posts(args.backup)
+    corpus = build_corpus(posts, max(args.sizes))
+
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, daemon=True,
+                                     args=(corpus, args.latency_ms, args.map_latency_ms, args.image_px,
+                                           args.page_kb, ready))
+    server.start()
+    base_url = ready.get(timeout=120)
+    corpus = [dict(post, content=post['content'].replace(BASE_URL, base_url)) for post in corpus]
+
+    session = requests.Session()
+    results = []
+    try:
+        print(f"{'scenario':<18} {'posts':>6} {'seconds':>9} {'ms/post':>9} {'requests':>9} {'MB served':>10}")
+        for size in args.sizes:
+            for scenario in args.scenarios:
+                times, served = [], None
+                for _ in range(args.repeat):
+                    server_stats(session, base_url, reset=True)
+                    times.append(run_scenario(scenario, corpus[:size], base_url, args))
+                    served = server_stats(session, base_url).json()
+                seconds = statistics.median(times)
+                result = {'scenario': scenario, 'posts': size, 'seconds': seconds, 'runs': times,
+                          'ms_per_post': 1000 * seconds / size,
+                          'requests': served['requests'], 'bytes_served': served['bytes']}
+                results.append(result)
+                print(f"{scenario:<18} {size:>6} {seconds:>9.2f} {result['ms_per_post']:>9.1f} "
+                      f"{served['requests']:>9} {served['bytes'] / 1e6:>10.1f}")
+    finally:
+        session.close()
+        server.terminate()
+        server.join()
+
+    if args.json:
+        report = {'meta': {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                           'revision': git_revision(),
+                           'python': platform.python_version(),
+                           'platform': platform.platform(),
+                           'cpus': os.cpu_count(),
+                           'backup': os.path.basename(args.backup),
+                           'latency_ms': args.latency_ms,
+                           'map_latency_ms': args.map_latency_ms,
+                           'image_px': args.image_px,
+                           'page_kb': args.page_kb,
+                           'chunk_size': args.chunk_size,
+                           'render_workers': args.render_workers},
+                  'results': results}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Times HTML parsing and docx rendering per post, before and after the single-pass renderer.
+
+"before" is a copy of the original post_body.descendants walk (kept here only for
+comparison); "after" is PostParser followed by TravelBlogExtractor.render_ir. Posts come from a Blogger
+export, and images and maps are replaced by a small placeholder so that no network
+or browser is involved.
+
+    python benchmarks/bench_render.py [--backup blog_backup/blog-01-11-2025.xml] [--repeat 5]
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT  # noqa: E402
+from docx.shared import Inches, Pt  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from extract_blog_entries import TravelBlogExtractor  # noqa: E402
+from post_ir import image_sources, map_sources  # noqa: E402
+
+ATOM = {'atom': 'http://www.w3.org/2005/Atom'}
+POST_KIND = 'http://schemas.google.com/blogger/2008/kind#post'
+
+
+def placeholder_png():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), (200, 200, 200)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PlaceholderImages:
+    """Stands in for ImageFetcher and MapCapturePool: every image and map is the same tiny PNG."""
+
+    def __init__(self):
+        self.image = placeholder_png()
+
+    def fetch(self, url):
+        return self.image
+
+    def fetch_all(self, urls):
+        return {url: self.image for url in urls}
+
+    def capture(self, src):
+        return self.image
+
+    def capture_all(self, srcs):
+        return {src: self.image for src in srcs}
+
+
+def load_posts(backup_file):
+    posts = []
+    for entry in ET.parse(backup_file).getroot().findall('atom:entry', ATOM):
+        kind = entry.find("atom:category[@scheme='http://schemas.google.com/g/2005#kind']", ATOM)
+        content = entry.find('atom:content', ATOM)
+        if kind is not None and kind.get('term') == POST_KIND and content is not None and content.text:
+            posts.append((entry.findtext('atom:title', 'No Title', ATOM), content.text))
+    return posts
+
+
+def make_extractor(html_parser):
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config:
+        json.dump({'BLOGGER_API_KEY': '', 'TRAVEL_BLOG_ID': ''}, config)
+    try:
+        extractor = TravelBlogExtractor(config_file=config.name, cache_dir=None, map_cache_dir=None,
+                                        ir_cache_dir=None, metrics_file=None, html_parser=html_parser)
+    finally:
+        os.remove(config.name)
+    extractor.image_fetcher = extractor.map_pool = PlaceholderImages()
+    return extractor
+
+
+def legacy_add_formatted_paragraph(doc, text, style=None, before=3, after=3, space_between=False):
+    paragraph = doc.add_paragraph(text, style=style)
+    paragraph.paragraph_format.space_before = Pt(before)
+    paragraph.paragraph_format.space_after = Pt(after)
+    paragraph.paragraph_format.space_between = space_between
+    return paragraph
+
+
+def legacy_add_image(doc, image, element):
+    paragraph = legacy_add_formatted_paragraph(doc, "", style='Body Text', before=4, after=4)
+    paragraph.add_run().add_picture(BytesIO(image), width=Inches(6.0))
+    paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    caption = element.get('title') or element.get('alt', '').strip()
+    if caption:
+        legacy_add_formatted_paragraph(doc, caption, style='Caption', before=0, after=6).alignment = \
+            WD_PARAGRAPH_ALIGNMENT.CENTER
+
+
+def legacy_process_list(extractor, doc, list_element, level=0):
+    ul_styles = ['List Bullet', 'List Bullet 2', 'List Bullet 3', 'List Bullet 4', 'List Bullet 5']
+    ol_styles = ['List Number', 'List Number 2', 'List Number 3', 'List Number 4', 'List Number 5']
+    list_styles = ul_styles if list_element.name == 'ul' else ol_styles
+    current_style = list_styles[min(level, len(list_styles) - 1)]
+    for child in list_element.children:
+        if child.name == 'li':
+            li_text = ""
+            for li_child in child.children:
+                if li_child.name == 'b':
+                    li_text += li_child.get_text(strip=True)
+                elif li_child.name == 'a':
+                    li_text += f"{li_child.get_text(strip=True)} ({li_child.get('href', '')}) "
+                elif li_child.string:
+                    li_text += li_child.string
+            legacy_add_formatted_paragraph(doc, li_text.strip(), style=current_style, before=3, after=3)
+            for li_child in child.children:
+                if li_child.name in ['ul', 'ol']:
+                    legacy_process_list(extractor, doc, li_child, level=level + 1)
+        elif child.name in ['ul', 'ol']:
+            legacy_process_list(extractor, doc, child, level=level + 1)
+
+
+def legacy_render(extractor, doc, post_body):
+    """The original descendants walk from process_blog_post, with its python-docx calls."""
+    for element in post_body.descendants:
+        if element.name in ('h1', 'h2', 'h3', 'h4'):
+            doc.add_heading(element.get_text(), level=int(element.name[1]))
+        elif element.name == 'p':
+            paragraph = legacy_add_formatted_paragraph(doc, "", style='Body Text', before=4, after=4,
+                                                       space_between=False)
+            for child in element.children:
+                if child.name == 'a':
+                    paragraph.add_run(child.get_text(strip=True))
+                    paragraph.add_run(f" ({child.get('href', '')})")
+                elif child.name == 'span':
+                    for span_child in child.children:
+                        if span_child.name == 'a':
+                            paragraph.add_run(span_child.get_text(strip=True))
+                            paragraph.add_run(f" ({span_child.get('href', '')})")
+                        elif span_child.string:
+                            paragraph.add_run(span_child.string)
+                elif child.string:
+                    paragraph.add_run(child.string)
+        elif element.name in ('ul', 'ol'):
+            legacy_process_list(extractor, doc, element)
+        elif element.name == 'img':
+            if element.get('src'):
+                legacy_add_image(doc, extractor.image_fetcher.image, element)
+        elif element.name == 'iframe':
+            if extractor.is_map_embed(element.get('src')):
+                doc.add_picture(BytesIO(extractor.map_pool.image), width=Inches(6.0))
+
+
+def new_render(extractor, doc, post_body):
+    ir = extractor.post_parser.parse("", post_body)
+    images = extractor.image_fetcher.fetch_all(image_sources(ir))
+    maps = extractor.map_pool.capture_all(map_sources(ir))
+    extractor.render_ir(doc, ir, images, maps)
+
+
+def time_post(extractor, renderer, html, repeat):
+    parse_times, render_times = [], []
+    for _ in range(repeat):
+        doc = extractor.typography.new_document()
+        start = time.perf_counter()
+        post_body = BeautifulSoup(html, extractor.html_parser)
+        parsed = time.perf_counter()
+        renderer(extractor, doc, post_body)
+        parse_times.append(parsed - start)
+        render_times.append(time.perf_counter() - parsed)
+    return statistics.median(parse_times), statistics.median(render_times), len(doc.paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backup', default=os.path.join(ROOT, 'blog_backup', 'blog-01-11-2025.xml'))
+    parser.add_argument('--repeat', type=int, default=5, help='runs per post; the median is reported')
+    parser.add_argument('--json', help='also write the per-post results to this file')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    posts = load_posts(args.backup)
+    parsers = ['html.parser'] + (['lxml'] if importlib.util.find_spec('lxml') else [])
+    variants = [('before', 'html.parser', legacy_render)] + [('after', p, new_render) for p in parsers]
+
+    results = []
+    print(f"{len(posts)} posts, median of {args.repeat} runs\n")
+    print(f"{'variant':<8} {'parser':<12} {'parse ms/post':>14} {'render ms/post':>15} {'paragraphs':>11}")
+    for name, html_parser, renderer in variants:
+        extractor = make_extractor(html_parser)
+        per_post = [time_post(extractor, renderer, html, args.repeat) for _, html in posts]
+        parse_ms = 1000 * statistics.mean(p for p, _, _ in per_post)
+        render_ms = 1000 * statistics.mean(r for _, r, _ in per_post)
+        paragraphs = sum(n for _, _, n in per_post)
+        print(f"{name:<8} {html_parser:<12} {parse_ms:>14.2f} {render_ms:>15.2f} {paragraphs:>11}")
+        results.append({'variant': name, 'parser': html_parser,
+                        'posts': [{'title': title, 'parse_s': p, 'render_s': r, 'paragraphs': n}
+                                  for (title, _), (p, r, n) in zip(posts, per_post)]})
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging
+import os
+
+
+def fingerprint(*parts) -> str:
+    """Stable sha256 over JSON-serialisable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class BuildManifest:
+    """
+    Records what went into each output file of a book build, so later runs only
+    re-render the outputs whose posts changed.
+
+    The manifest is a JSON file stored next to the outputs, keyed by output file name:
+        fingerprint  hash over the render settings and the versions of its posts
+        posts        url, fingerprint (updated timestamp or content hash), images and maps embedded
+                     for each post and those missing, and its embedded bytes and estimated pages
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.outputs = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    self.outputs = data.get("outputs", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    def fingerprint_of(self, output_file):
+        """Fingerprint output_file was last built from, or None if it is unknown or incomplete."""
+        entry = self.outputs.get(os.path.basename(output_file))
+        return entry["fingerprint"] if entry else None
+
+    def record_output(self, output_file, output_fingerprint, posts):
+        """
+        :param output_file: The file that was built.
+        :param output_fingerprint: Fingerprint it was built from; None marks it as needing a rebuild.
+        :param posts: One dict per post with url, fingerprint, images, maps and missing
+                      (and bytes and pages, the weight used for size-aware chunking).
+        """
+        self.outputs[os.path.basename(output_file)] = {
+            "fingerprint": output_fingerprint,
+            "posts": list(posts),
+        }
+
+    def post_record(self, url, post_fingerprint):
+        """The record of a post at this version from any output, or None if it was not built yet."""
+        for output in self.outputs.values():
+            for post in output["posts"]:
+                if post["url"] == url and post["fingerprint"] == post_fingerprint:
+                    return post
+        return None
+
+    def forget_output(self, output_file):
+        self.outputs.pop(os.path.basename(output_file), None)
+
+    def outputs_starting_with(self, prefix):
+        return [name for name in self.outputs if name.startswith(prefix)]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "outputs": self.outputs}, f, indent=2)
+        os.replace(tmp_path, self.path)
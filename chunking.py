@@ -0,0 +1,96 @@
+import logging
+from io import BytesIO
+from typing import Dict, List
+
+from PIL import Image
+
+# printable area of the default template (Letter, 1" margins) and a rough text density
+# for 11pt body text on a 6.5" line; good enough to balance files, not to paginate
+PAGE_HEIGHT_INCHES = 9.0
+CHARS_PER_PAGE = 3000
+BLOCK_HEIGHT_INCHES = {'heading': 0.5, 'paragraph': 0.15, 'list_item': 0.1, 'image': 0.2, 'map': 0.0}
+
+
+def image_height_inches(image_bytes, width_inches) -> float:
+    """Printed height of an image scaled to width_inches, read from its header only."""
+    try:
+        with Image.open(BytesIO(image_bytes)) as image:
+            width, height = image.size
+        return width_inches * height / width if width else 0.0
+    except Exception as e:
+        logging.warning(f"Could not read image size, assuming a 4:3 image: {e}")
+        return width_inches * 3 / 4
+
+
+def post_weight(ir, images, maps, width_inches) -> Dict[str, float]:
+    """
+    What a post adds to a document: the bytes of its embedded images and maps, and an
+    estimate of the pages it fills (image heights at the printed width, plus its text).
+
+    :param ir: The parsed post (see PostParser).
+    :param images: Image bytes by src, None for failed downloads.
+    :param maps: Map screenshots by src, None for failed captures.
+    :param width_inches: Printed width of images and maps.
+    :return: {'bytes': int, 'pages': float}
+    """
+    embedded = [content for content in list(images.values()) + list(maps.values()) if content is not None]
+    height = sum(image_height_inches(content, width_inches) for content in embedded)
+    height += sum(BLOCK_HEIGHT_INCHES.get(block['type'], 0.0) for block in ir['blocks'])
+    characters = sum(len(run if isinstance(run, str) else run['text'] + run['href'])
+                     for block in ir['blocks'] for run in block.get('runs', ()))
+    characters += sum(len(block.get('text', '')) for block in ir['blocks'])
+    pages = height / PAGE_HEIGHT_INCHES + characters / CHARS_PER_PAGE
+    return {'bytes': sum(len(content) for content in embedded), 'pages': round(pages, 3)}
+
+
+class ChunkBudget:
+    """
+    Limits on what goes into one output file. A post is started in a new file when adding
+    it to a non-empty one would exceed a limit, so a single post larger than the budget
+    still gets a file of its own.
+    """
+
+    def __init__(self, max_bytes=None, max_pages=None):
+        """
+        :param max_bytes: Maximum embedded image and map bytes per file; None for no limit.
+        :param max_pages: Maximum estimated pages per file; None for no limit.
+        """
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self.reset()
+
+    def reset(self):
+        self.used = {'bytes': 0, 'pages': 0.0}
+        self.posts = 0
+
+    def fits(self, weight) -> bool:
+        if self.posts == 0:
+            return True
+        if self.max_bytes and self.used['bytes'] + weight['bytes'] > self.max_bytes:
+            return False
+        if self.max_pages and self.used['pages'] + weight['pages'] > self.max_pages:
+            return False
+        return True
+
+    def add(self, weight):
+        self.used['bytes'] += weight['bytes']
+        self.used['pages'] += weight['pages']
+        self.posts += 1
+
+    def plan(self, weights: List[Dict[str, float]]) -> List[List[int]]:
+        """
+        Splits posts into files, in order, by their weights.
+
+        :return: Lists of post indexes, one per file.
+        """
+        chunks = []
+        self.reset()
+        for idx, weight in enumerate(weights):
+            if not self.fits(weight):
+                self.reset()
+            if self.posts == 0:
+                chunks.append([])
+            chunks[-1].append(idx)
+            self.add(weight)
+        self.reset()
+        return chunks
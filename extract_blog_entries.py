@@ -1,6 +1,6 @@
+import argparse
 import json
 import logging
-from googleapiclient.discovery import build
 from docx import Document
 import requests
 from bs4 import BeautifulSoup
@@ -8,20 +8,27 @@ from typing import List
 from io import BytesIO
 from docx.shared import Inches
 from docx.shared import RGBColor
-from docx.shared import Pt
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-from docx2pdf import convert
+import hashlib
 import os
+import weakref
+import sys
 import time
-from datetime import datetime
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from image_fetcher import ImageFetcher
+from http_cache import HttpCache
+from map_capture import MapCapturePool
+from build_manifest import BuildManifest, fingerprint
+from image_pipeline import ImagePipeline
+from pdf_converter import LibreOfficeConverter, find_soffice
+from post_store import PostStore, normalize_timestamp
+from typography import Typography, FIGURE_STYLE
+from pipeline import run_ahead
+from metrics import Metrics
+from chunking import ChunkBudget, post_weight
+from media_registry import MediaRegistry
+from post_ir import IR_VERSION, PostCache, PostParser, image_sources, is_map_embed, map_sources, media_record
 
 # configure logging
 # logging.basicConfig(level=logging.INFO,
@@ -37,51 +44,358 @@ logging.basicConfig(
     ]
 )
 
+# where outputs, caches and the URL list go unless told otherwise
+OUTPUT_DIR = "test_output"
+
+# the Blogger API caps posts.list at 500 items per page
+API_PAGE_SIZE = 500
+API_POST_FIELDS = "id,url,title,content,published,updated,labels"
+# bump when a change to the renderer should invalidate every previously built output
+RENDER_VERSION = 5
+
+# BeautifulSoup parser for post pages and bodies; html_parser='lxml' parses several times
+# faster where lxml is installed, and gives the same parsed posts
+DEFAULT_HTML_PARSER = 'html.parser'
+
+# intermediate block type -> TravelBlogExtractor method adding it to a document
+IR_RENDERERS = {
+    'heading': 'render_heading',
+    'paragraph': 'render_paragraph',
+    'list_item': 'render_list_item',
+    'image': 'render_image',
+    'map': 'render_map',
+}
+
+# Word list styles by nesting level, for unordered and ordered lists
+LIST_STYLES = {
+    False: ['List Bullet', 'List Bullet 2', 'List Bullet 3', 'List Bullet 4', 'List Bullet 5'],
+    True: ['List Number', 'List Number 2', 'List Number 3', 'List Number 4', 'List Number 5'],
+}
+
+
+# document part -> {style name: style id}
+_style_ids = weakref.WeakKeyDictionary()
+
+
+def style_id(doc, style):
+    """The id of a style of doc, or None if doc has no such style; resolved once per document."""
+    ids = _style_ids.setdefault(doc.part, {})
+    if style not in ids:
+        ids[style] = doc.styles[style].style_id if style in doc.styles else None
+    return ids[style]
+
+
+def add_styled_paragraph(doc, text="", style=None):
+    """
+    Same as doc.add_paragraph(text, style), minus python-docx's per-call style lookup,
+    which scans every style in the document; style ids are resolved once per document.
+    """
+    style_ref = style_id(doc, style) if style else None
+    if style and style_ref is None:
+        raise KeyError(f"no style with name '{style}'")
+    paragraph = doc.add_paragraph(text)
+    if style_ref:
+        paragraph._p.style = style_ref
+    return paragraph
+
+
+def add_heading(doc, text, level):
+    return add_styled_paragraph(doc, text, f"Heading {level}")
+
+
+class DocxDocument:
+    """
+    A Word document with the interface of pdf_backend.PdfDocument (add_post, add_heading,
+    add_page_break, save), so the builders treat both backends alike. Posts are added
+    by the extractor's docx renderers, see TravelBlogExtractor.render_ir.
+    """
+
+    # Word lays out the pages when the file is opened; only the PDF backend counts them
+    pages = None
+
+    def __init__(self, extractor, output_file):
+        """
+        :param extractor: The TravelBlogExtractor whose typography and renderers are used.
+        :param output_file: Path of the .docx to write.
+        """
+        self.extractor = extractor
+        self.output_file = output_file
+        self.doc = extractor.typography.new_document()
+
+    def add_heading(self, text, level):
+        add_heading(self.doc, text, level)
+
+    def add_page_break(self):
+        self.doc.add_page_break()
+
+    def add_post(self, ir, images, maps):
+        """
+        Adds a parsed post, title first.
+
+        :param images: Image bytes by src, None for failed downloads.
+        :param maps: Map captures by src, None for failed captures.
+        :return: The image and map URLs the post pulled in, see media_record.
+        """
+        add_heading(self.doc, ir['title'], 2)
+        self.extractor.render_ir(self.doc, ir, images, maps)
+        return media_record(images, maps)
+
+    def save(self):
+        """Writes the document to output_file."""
+        self.doc.save(self.output_file)
+
+
 class TravelBlogExtractor:
     def __init__(self, 
-                 blog_post_list=".\\test_output\\blog_post_urls.txt",
+                 blog_post_list=os.path.join(OUTPUT_DIR, "blog_post_urls.txt"),
                  page_load_wait=30, 
                  web_driver_wait=30,
-                 render_pause=4,
-                 output_docx_file=".\\test_output\\travel_blog_posts.docx", 
-                 output_pdf_file=".\\test_output\\travel_blog_posts.pdf", 
-                 output_docx_path=".\\test_output", 
+                 map_settle_time=0.5,
+                 map_workers=2,
+                 map_cache_dir=os.path.join(OUTPUT_DIR, "map_cache"),
+                 map_size=(1200, 900),
+                 map_format="jpeg",
+                 map_quality=85,
+                 map_pool_factory=None,
+                 output_docx_file=os.path.join(OUTPUT_DIR, "travel_blog_posts.docx"),
+                 output_pdf_file=os.path.join(OUTPUT_DIR, "travel_blog_posts.pdf"),
+                 output_docx_path=OUTPUT_DIR,
                  file_name_starts_with="travel_blog_posts_",
-                 chunk_size=1):
-        self.config_file = ".\\config.json"
+                 chunk_size=1,
+                 chunk_max_bytes=None,
+                 chunk_max_pages=None,
+                 image_workers=8,
+                 image_per_host_limit=4,
+                 request_timeout=30,
+                 max_retries=3,
+                 cache_dir=os.path.join(OUTPUT_DIR, "http_cache"),
+                 cache_max_bytes=2 * 1024 ** 3,
+                 offline=False,
+                 fetch_from_api=False,
+                 incremental=True,
+                 image_width_inches=6.0,
+                 image_dpi=200,
+                 image_quality=85,
+                 strip_image_metadata=True,
+                 render_workers=1,
+                 pdf_backend="auto",
+                 pdf_workers=None,
+                 pdf_font_files=None,
+                 html_parser=None,
+                 post_store_file=os.path.join(OUTPUT_DIR, "posts.sqlite3"),
+                 post_query=None,
+                 font_name="Aptos",
+                 docx_template=None,
+                 ir_cache_dir=os.path.join(OUTPUT_DIR, "post_ir"),
+                 pipeline_workers=4,
+                 pipeline_depth=8,
+                 metrics_file=os.path.join(OUTPUT_DIR, "metrics.jsonl"),
+                 profile=None,
+                 run_id=None,
+                 config_file="config.json"):
+        # kept so worker processes can build an identical extractor
+        self.init_kwargs = {name: value for name, value in locals().items() if name != 'self'}
+        self.config_file = config_file
         self.blog_post_list = blog_post_list
         self.page_load_wait = page_load_wait
         self.web_driver_wait = web_driver_wait
-        self.render_pause = render_pause
+        self.map_settle_time = map_settle_time
+        self.map_workers = map_workers
+        self.map_cache_dir = map_cache_dir
+        self.map_size = tuple(map_size)
+        self.map_format = map_format
+        self.map_quality = map_quality
+        self.map_pool_factory = map_pool_factory
 
         self.output_docx_file = output_docx_file
         self.output_pdf_file = output_pdf_file
         self.output_docx_path = output_docx_path
         self.file_name_starts_with = file_name_starts_with
         self.chunk_size = chunk_size
+        self.chunk_max_bytes = chunk_max_bytes
+        self.chunk_max_pages = chunk_max_pages
+        # size-aware chunking replaces chunk_size when a byte or page budget is set
+        self.chunk_budget = ChunkBudget(chunk_max_bytes, chunk_max_pages) \
+            if chunk_max_bytes or chunk_max_pages else None
+        self.image_workers = image_workers
+        self.image_per_host_limit = image_per_host_limit
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.offline = offline
+        self.fetch_from_api = fetch_from_api
+        self.incremental = incremental
+        self.image_width_inches = image_width_inches
+        self.image_dpi = image_dpi
+        self.image_quality = image_quality
+        self.strip_image_metadata = strip_image_metadata
+        self.render_workers = render_workers
+        self.pdf_backend = pdf_backend
+        self.pdf_workers = pdf_workers
+        self.pdf_font_files = pdf_font_files
+        self.html_parser = html_parser or DEFAULT_HTML_PARSER
+        self.post_store_file = post_store_file
+        self.post_query = post_query
+        self.font_name = font_name
+        self.docx_template = docx_template
+        self.ir_cache_dir = ir_cache_dir
+        self.pipeline_workers = pipeline_workers
+        self.pipeline_depth = pipeline_depth
+        self.metrics_file = metrics_file
 
         with open(self.config_file, "r") as config_file:
             self.config = json.load(config_file)
         self.blogger_api_key = self.config['BLOGGER_API_KEY']
         self.travel_blog_id = self.config['TRAVEL_BLOG_ID']
+        # per-stage and per-post timings; config.json may switch the profiler on with "PROFILE": "cprofile"
+        self.profile = self.config.get('PROFILE') if profile is None else profile
+        self.metrics = Metrics(self.metrics_file, profile=self.profile or None, run_id=run_id)
 
         # Create a reusable session
         self.session = requests.Session()
-        # create a reusable webdriver
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+        # size the connection pool so concurrent image downloads don't queue for a connection
+        adapter = HTTPAdapter(pool_connections=self.image_workers, pool_maxsize=self.image_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # persistent cache for post pages and images; cache_dir=None disables it
+        self.http_cache = HttpCache(self.cache_dir, self.cache_max_bytes, self.offline) if self.cache_dir else None
+        # resize / re-encode images in the download threads, before they reach the document
+        self.image_pipeline = ImagePipeline(width_inches=self.image_width_inches,
+                                            dpi=self.image_dpi,
+                                            quality=self.image_quality,
+                                            strip_metadata=self.strip_image_metadata)
+        self.image_fetcher = ImageFetcher(self.session,
+                                          max_workers=self.image_workers,
+                                          per_host_limit=self.image_per_host_limit,
+                                          timeout=self.request_timeout,
+                                          max_retries=self.max_retries,
+                                          cache=self.http_cache,
+                                          transform=self.image_pipeline.prepare)
+        # posts are parsed once into an intermediate form, cached on disk per post version
+        self.post_parser = PostParser(self.html_parser)
+        self.post_cache = PostCache(self.ir_cache_dir)
+        # fonts and spacing, set on the styles of every new document
+        self.typography = Typography(font_name=self.font_name, template_file=self.docx_template)
+        # pool of headless webdrivers for map screenshots, started on first use; map_pool_factory
+        # (e.g. a MapCapturePool subclass, picklable so render workers build the same) replaces it
+        map_pool_factory = self.map_pool_factory or MapCapturePool
+        self.map_pool = map_pool_factory(size=self.map_workers,
+                                         render_timeout=self.web_driver_wait,
+                                         settle_time=self.map_settle_time,
+                                         capture_size=self.map_size,
+                                         image_format=self.map_format,
+                                         quality=self.map_quality,
+                                         cache_dir=self.map_cache_dir)
+
+    def blogger_service(self):
+        # the API client is slow to import and only needed by runs that talk to Blogger
+        from googleapiclient.discovery import build
+        return build('blogger', 'v3', developerKey=self.blogger_api_key)
+
+    def list_blog_posts(self, fields) -> List[dict]:
+        """
+        Pages through the Blogger API post listing, oldest post first.
+
+        :param fields: Partial-response projection for each item, e.g. 'url' or 'url,title,content'.
+        :return: The post dicts, minus the placeholder first/second posts.
+        """
+        with self.metrics.stage("list_posts") as stage:
+            service = self.blogger_service()
+            posts = []
+            request = service.posts().list(blogId=self.travel_blog_id,
+                                           maxResults=API_PAGE_SIZE,
+                                           fetchBodies='content' in fields,
+                                           fields=f"nextPageToken,items({fields})")
+            while request is not None:
+                response = request.execute()
+                for post in response.get('items', []):
+                    post_url = post.get('url', '').lower()
+                    if 'second-post' not in post_url and 'first-post' not in post_url:
+                        posts.append(post)
+                request = service.posts().list_next(request, response)
+            stage['posts'] = len(posts)
+        return list(reversed(posts))
 
     def get_travel_blog_urls(self) -> List[str]:
-        service = build('blogger', 'v3', developerKey=self.blogger_api_key)
-        post_links = []
-        request = service.posts().list(blogId=self.travel_blog_id, maxResults=100)
-        while request is not None:
-            response = request.execute()
-            for post in response.get('items', []):
-                post_url = post.get('url', '').lower()
-                if 'second-post' not in post_url and 'first-post' not in post_url:
-                    post_links.append(post['url'])
-            request = service.posts().list_next(request, response)
-        return list(reversed(post_links))
+        return [post['url'] for post in self.list_blog_posts('url')]
+
+    def get_travel_blog_posts(self) -> List[dict]:
+        """
+        Fetches every post with its body in the paginated listing itself, so posts
+        can be rendered without downloading their pages.
+        """
+        return self.list_blog_posts(API_POST_FIELDS)
+
+    def sync_post_store(self) -> int:
+        """
+        Pulls posts from the Blogger API into the local post store, newest first,
+        stopping at the first post that is not newer than what the store already has.
+
+        :return: Number of posts added or updated.
+        """
+        store = PostStore(self.post_store_file)
+        try:
+            since = store.last_updated(self.travel_blog_id)
+            service = self.blogger_service()
+            request = service.posts().list(blogId=self.travel_blog_id,
+                                           maxResults=API_PAGE_SIZE,
+                                           orderBy='updated',
+                                           fetchBodies=True,
+                                           fields=f"nextPageToken,items({API_POST_FIELDS},author/displayName)")
+            changed = 0
+            while request is not None:
+                response = request.execute()
+                items = response.get('items', [])
+                fresh = [post for post in items if since is None or normalize_timestamp(post.get('updated')) > since]
+                changed += store.index_api_posts(self.travel_blog_id, fresh)
+                if len(fresh) < len(items):
+                    break
+                request = service.posts().list_next(request, response)
+            logging.info(f"Post store {self.post_store_file}: {changed} posts added or updated")
+            return changed
+        finally:
+            store.close()
+
+    def select_posts(self, **query) -> List[dict]:
+        """
+        Picks posts from the local post store, e.g. select_posts(labels=['Botswana'], start='2024-06-01').
+        See PostStore.select for the query options.
+        """
+        store = PostStore(self.post_store_file)
+        try:
+            posts = store.select(**query)
+        finally:
+            store.close()
+        return [post for post in posts
+                if 'second-post' not in (post['url'] or '').lower() and 'first-post' not in (post['url'] or '').lower()]
+
+    def load_posts(self, blog_post_list):
+        """
+        Returns the posts to render: the result of post_query against the local post store
+        if set, API payloads when fetch_from_api is set, otherwise the page URLs listed in blog_post_list.
+        """
+        if self.post_query is not None:
+            return self.select_posts(**self.post_query)
+        if self.fetch_from_api:
+            return self.get_travel_blog_posts()
+        with open(blog_post_list, "r", encoding="utf-8") as file:
+            return [line.strip() for line in file.readlines() if line.strip()]
+
+    def http_get(self, url):
+        """
+        Fetches a URL through the persistent cache when one is configured.
+
+        :param url: The URL to fetch.
+        :return: The response (a requests.Response or a cached stand-in).
+        """
+        if self.http_cache is not None:
+            return self.http_cache.get(self.session, url, timeout=self.request_timeout)
+        return self.session.get(url, timeout=self.request_timeout)
+
+    @staticmethod
+    def is_map_embed(src):
+        return is_map_embed(src)
 
     def add_caption(self, doc, text):
         """
@@ -90,288 +404,654 @@ class TravelBlogExtractor:
         :param doc: The Word document object.
         :param text: The caption text to add.
         """
-        caption_paragraph = doc.add_paragraph(text, style='Caption')
-        caption_format = caption_paragraph.paragraph_format
-        caption_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER  # Center align the caption
-        caption_format.space_before = Pt(0)  # Optional: Space before the caption
-        caption_format.space_after = Pt(6)   # Optional: Space after the caption
+        add_styled_paragraph(doc, text, style='Caption')  # centered and spaced by the Caption style
 
-    def add_centered_image(self, doc, img_src):
+    def add_centered_image(self, doc, img_src, image_bytes=None):
         """
         Adds a centered image to the document.
 
         :param doc: The Word document object.
         :param img_src: The source URL or path of the image to add.
+        :param image_bytes: The downloaded image content (see fetch_media), None if the download failed.
         """
         try:
-            img_response = self.session.get(img_src)
-            if img_response.status_code == 200:
-                image_stream = BytesIO(img_response.content)
-                paragraph = self.add_formatted_paragraph(doc,
-                                                            "",
-                                                            style='Body Text',
-                                                            before=4,
-                                                            after=4,
-                                                            space_between=False)
+            if image_bytes is not None:
+                image_stream = BytesIO(image_bytes)
+                paragraph = add_styled_paragraph(doc, "", style=FIGURE_STYLE)  # centered by the style
                 run = paragraph.add_run()
-                run.add_picture(image_stream, width=Inches(6.0))
-                paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+                run.add_picture(image_stream, width=Inches(self.image_width_inches))
             else:
-                logging.error(f"Failed to download image: {img_src} - Status Code: {img_response.status_code}")
+                logging.error(f"Failed to download image: {img_src}")
         except Exception as img_e:
             logging.error(f"Failed to add image: {img_src}, error: {img_e}")
 
-    def download_and_add_image(self, doc, img_src, element):
+    def download_and_add_image(self, doc, img_src, caption=None, image_bytes=None):
         """
-        Downloads an image from the provided source URL and adds it to the document,
-        with an optional caption derived from the element attributes.
+        Adds a downloaded image to the document, with an optional caption (the title or
+        alt text of the image).
+
+        :param doc: The Word document object.
+        :param img_src: The source URL of the image (for logging).
+        :param caption: Optional caption below the image.
+        :param image_bytes: The downloaded image content (see fetch_media), None if the download failed.
         """
         try:
-            self.add_centered_image(doc, img_src)
+            self.add_centered_image(doc, img_src, image_bytes)
 
-            # Retrieve caption from the image element
-            caption = element.get('title') or element.get('alt', '').strip()
             if caption:
                 self.add_caption(doc, caption)
         except Exception as img_e:
-            logging.error(f"Failed to download or add image: {img_src}, error: {img_e}")
+            logging.error(f"Failed to add image: {img_src}, error: {img_e}")
 
-    def download_and_add_map_sshot(self, doc, title, map_src):
+    def download_and_add_map_sshot(self, doc, title, map_src, screenshot=None):
+        """
+        Adds a screenshot of an embedded Google Map to the document.
+
+        :param doc: The Word document object.
+        :param title: Title of the post the map belongs to (for logging).
+        :param map_src: The iframe src of the map embed.
+        :param screenshot: The captured map image (see fetch_media), None if the capture failed.
+        """
         try:
-            options = webdriver.ChromeOptions()
-            options.add_argument('--headless')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-
-            logging.info(f"Loading map at {map_src} in page {title}")
-            self.driver.get(map_src)
-
-            # Wait until the map iframe is loaded
-            WebDriverWait(self.driver, self.web_driver_wait).until(EC.presence_of_element_located((By.TAG_NAME, 'iframe')))
-            logging.info(f" -> webdrive wait ({self.web_driver_wait}s) complete")
-
-            # Wait for the page to load completely
-            # time.sleep(self.page_load_wait)
-            time.sleep(self.render_pause)
-            logging.info(f" -> render pause ({self.render_pause}s) complete")
-
-            screenshot = self.driver.get_screenshot_as_png()
-            map_stream = BytesIO(screenshot)
-            # paragraph = self.add_formatted_paragraph(doc=doc,
-            #                                          text="",
-            #                                          style='Body Text',
-            #                                          before=4,
-            #                                          after=4,
-            #                                          space_between=False)
-            # run = paragraph.add_run()
-            # run.add_picture(map_stream, width=Inches(6.0))
-            # paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            doc.add_picture(map_stream, width=Inches(6.0))
+            if screenshot is not None:
+                self.add_centered_image(doc, map_src, screenshot)
+            else:
+                logging.error(f"Failed to capture map in page {title}: {map_src}")
         except Exception as map_e:
             logging.error(f"Failed to download map: {map_src}, error: {map_e}")
 
-    @staticmethod
-    def set_font_to_aptos(doc):
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                run.font.name = 'Aptos'
-                r = run._element
-                rPr = r.get_or_add_rPr()
-                rFonts = OxmlElement('w:rFonts')
-                rFonts.set(qn('w:ascii'), 'Aptos')
-                rFonts.set(qn('w:hAnsi'), 'Aptos')
-                rFonts.set(qn('w:eastAsia'), 'Aptos')
-                rFonts.set(qn('w:cs'), 'Aptos')
-                rPr.append(rFonts)
-
-    def add_formatted_paragraph(self, doc, text, style=None, before=3, after=3, space_between=False):
-        """
-        Adds a formatted paragraph to the document.
-
-        :param doc: The Word document object.
-        :param text: The text to add to the paragraph.
-        :param style: Optional style to apply to the paragraph.
-        :param before: Space before the paragraph (in points).
-        :param after: Space after the paragraph (in points).
-        :param space_between: Don't add space between paragraphs of the same style (True/False)
-        """
-        paragraph = doc.add_paragraph(text, style=style)
-        paragraph_format = paragraph.paragraph_format
-        paragraph_format.space_before = Pt(before) # 3pt before the paragraph
-        paragraph_format.space_after = Pt(after) # 3pt after the paragraph
-        paragraph_format.space_between = space_between  # Uncheck "Don't add space between paragraphs of the same style"
+    def add_runs(self, paragraph, runs):
+        """Adds the inline runs of an intermediate text block; links are followed by their URL."""
+        for run in runs:
+            if isinstance(run, str):
+                paragraph.add_run(run)
+            else:
+                if run['text']:
+                    paragraph.add_run(run['text'])
+                if run['href']:
+                    paragraph.add_run(f" ({run['href']})")  # Append the URL
         return paragraph
 
-    def process_list(self, doc, list_element, level=0):
+    def render_heading(self, doc, block, post):
+        add_heading(doc, block['text'], block['level'])
+
+    def render_paragraph(self, doc, block, post):
+        self.add_runs(add_styled_paragraph(doc, "", style='Body Text'), block['runs'])
+
+    def render_list_item(self, doc, block, post):
+        # the default template stops at List Bullet 3 / List Number 3; deeper levels use the deepest it has
+        list_styles = [style for style in LIST_STYLES[block['ordered']] if style_id(doc, style)]
+        style = list_styles[min(block['level'], len(list_styles) - 1)]
+        self.add_runs(add_styled_paragraph(doc, "", style=style), block['runs'])
+
+    def render_image(self, doc, block, post):
+        self.download_and_add_image(doc, block['src'], block['caption'], post['images'][block['src']])
+
+    def render_map(self, doc, block, post):
+        self.download_and_add_map_sshot(doc, post['title'], block['src'], post['maps'][block['src']])
+
+    def render_ir(self, doc, ir, images, maps):
+        """
+        The docx backend: adds the blocks of a parsed post to the document.
+
+        :param ir: The post, as produced by PostParser.
+        :param images: Image bytes by src for every image of the post (see fetch_media), None for
+                       failed downloads.
+        :param maps: Map screenshots by src for every map of the post, None for failed captures.
+        """
+        # media is fetched ahead of the writer (see prepare_post), never on this thread
+        missing = [src for src in image_sources(ir) if src not in images] + \
+                  [src for src in map_sources(ir) if src not in maps]
+        if missing:
+            raise ValueError(f"Media of {ir['title']!r} was not fetched before rendering: {missing}")
+        post = {'title': ir['title'], 'images': images, 'maps': maps}
+        for block in ir['blocks']:
+            getattr(self, IR_RENDERERS[block['type']])(doc, block, post)
+
+    def parse_page(self, content):
+        """
+        Extracts the title and body from a downloaded post page.
+
+        :return: (title, post_body); post_body is None if the page has no post body.
+        """
+        soup = BeautifulSoup(content, self.html_parser)
+        title = soup.find("title").get_text().replace("Travel diaries: ", "") if soup.find("title") else "No Title"
+        post_body = soup.find("div", class_="post-body")
+        # logging.debug(post_body)
+        return title, post_body
+
+    def load_ir(self, post, stats=None):
+        """
+        Returns the intermediate representation of a post given either as a page URL or
+        as a Blogger API payload, parsing it only if this version of the post is not cached.
+        API payloads are keyed by their updated timestamp and need no download at all;
+        pages are keyed by a hash of the downloaded page.
+
+        :param stats: Optional dict receiving fetch_s, page_bytes (downloaded over the network),
+                      page_cache_hit, parse_s and cached (whether the parsed post was cached).
+        :return: The parsed post (see PostParser), or None if the post could not be loaded.
         """
-        Processes <ul> or <ol> elements and their <li> children hierarchically,
-        ensuring proper handling of nested lists with appropriate indentation.
+        url = self.post_url(post)
+        stats = {} if stats is None else stats
+        try:
+            if isinstance(post, dict):
+                version = post.get('updated') or fingerprint(post.get('title'), post.get('content'))
+                key = self.post_cache.key(self.html_parser, url, version)
+                content = None
+            else:
+                start = time.perf_counter()
+                response = self.http_get(url)
+                stats['fetch_s'] = round(time.perf_counter() - start, 6)
+                stats['page_cache_hit'] = getattr(response, 'from_cache', False)
+                stats['page_bytes'] = 0 if stats['page_cache_hit'] else len(response.content)
+                if response.status_code != 200:
+                    logging.error(f"Failed to load post: {url} - Status Code: {response.status_code}")
+                    return None
+                key = self.post_cache.key(self.html_parser, url, hashlib.sha256(response.content).hexdigest())
+                content = response.content
+
+            ir = self.post_cache.get(key)
+            stats['cached'] = ir is not None
+            if ir is None:
+                start = time.perf_counter()
+                if content is None:
+                    ir = self.post_parser.parse_html(post.get('title') or "No Title", post.get('content', ''))
+                else:
+                    ir = self.post_parser.parse(*self.parse_page(content))
+                stats['parse_s'] = round(time.perf_counter() - start, 6)
+                self.post_cache.put(key, ir)
+            return ir
+        except Exception as e:
+            logging.error(f"Error processing {url}: {e}")
+            return None
+
+    @staticmethod
+    def post_url(post):
+        return post.get('url') if isinstance(post, dict) else post
+
+    def post_fingerprint(self, post, loaded=None):
         """
-        # Map levels to corresponding Word styles for unordered and ordered lists
-        ul_styles = ['List Bullet', 'List Bullet 2', 'List Bullet 3', 'List Bullet 4', 'List Bullet 5']
-        ol_styles = ['List Number', 'List Number 2', 'List Number 3', 'List Number 4', 'List Number 5']
+        Version of a post as far as the book is concerned: the updated timestamp for
+        API payloads, a hash of the parsed title and body for scraped pages.
 
-        # Determine the style set based on the type of list
-        if list_element.name == 'ul':
-            list_styles = ul_styles
-        elif list_element.name == 'ol':
-            list_styles = ol_styles
+        :param loaded: Optional dict of parsed posts by URL, as (ir, stats) of load_ir. Posts
+                       found there are not loaded again, and posts loaded here are added to it,
+                       so prepare_post can render them without downloading the page again.
+        :return: The fingerprint, or None if the post could not be loaded.
+        """
+        if isinstance(post, dict) and post.get('updated'):
+            return post['updated']
+        url = self.post_url(post)
+        if loaded is not None and url in loaded:
+            ir = loaded[url][0]
         else:
-            return  # Ignore unsupported elements
-
-        current_style = list_styles[min(level, len(list_styles) - 1)]  # Use the deepest style if level exceeds limit
-
-        # Loop through each child of the list element
-        for child in list_element.children:
-            if child.name == 'li':  # Process list items
-                li_text = ""  # Initialize text for the list item
-
-                # Process the contents of the <li> (text, links, or spans)
-                for li_child in child.children:
-                    if li_child.name == 'b':  # Handle bold text explicitly
-                        bold_text = li_child.get_text(strip=True)
-                        li_text += f"{bold_text}"  # Add bold text (adjust formatting as needed)
-                    elif li_child.name == 'a':  # Handle hyperlinks
-                        href = li_child.get('href', '')
-                        link_text = li_child.get_text(strip=True)
-                        li_text += f"{link_text} ({href}) "
-                    elif li_child.string:  # Handle plain text
-                        li_text += li_child.string
-
-                # Add the formatted paragraph for the <li>
-                self.add_formatted_paragraph(doc, li_text.strip(), style=current_style, before=3, after=3)
-
-                # Handle nested <ul> or <ol>
-                for li_child in child.children:
-                    if li_child.name in ['ul', 'ol']:
-                        self.process_list(doc, li_child, level=level + 1)
-
-            elif child.name in ['ul', 'ol']:  # Nested <ul> or <ol> directly under a list (rare case)
-                self.process_list(doc, child, level=level + 1)
+            stats = {}
+            ir = self.load_ir(post, stats)
+            if ir is not None and loaded is not None:
+                loaded[url] = (ir, stats)
+        if ir is None:
+            return None
+        return fingerprint(ir['title'], ir['blocks'])
 
-    def process_blog_post(self, doc, link):
+    def process_post(self, doc, post):
+        """
+        Renders a post given either as a page URL or as a Blogger API payload.
+
+        :return: The images and maps the post pulled in, or None if it could not be rendered.
+        """
         logging.info("++ entering process blog post ++")
+        return self.render_prepared(doc, post, self.prepare_post(post))
+
+    def prepare_post(self, post, media=None, loaded=None):
+        """
+        Everything that happens before a post is added to a document: downloading and
+        parsing it, fetching its images and capturing its maps. Touches no document, so
+        it runs ahead of the writer on the pipeline threads.
+
+        :param media: Optional MediaRegistry of the document, see fetch_media.
+        :param loaded: Optional dict of posts parsed while fingerprinting, see post_fingerprint;
+                       the post is taken (and removed) from it instead of being loaded again.
+
+        :return: (ir, images, maps, stats), or None if the post could not be loaded.
+        """
+        stats = {}
+        if loaded is not None and self.post_url(post) in loaded:
+            ir, load_stats = loaded.pop(self.post_url(post))
+            stats.update(load_stats)
+        else:
+            ir = self.load_ir(post, stats)
+        if ir is None:
+            self.metrics.post(self.post_url(post), failed=True, **stats)
+            return None
         try:
-            response = self.session.get(link)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                title = soup.find("title").get_text().replace("Travel diaries: ", "") if soup.find("title") else "No Title"
-                doc.add_heading(title, level=2)
-
-                post_body = soup.find("div", class_="post-body")
-                # logging.debug(post_body)
-                if post_body:
-                    for element in post_body.descendants:
-
-                        if element.name == 'h1':
-                            doc.add_heading(element.get_text(), level=1)
-                        elif element.name == 'h2':
-                            doc.add_heading(element.get_text(), level=2)
-                        elif element.name == 'h3':
-                            doc.add_heading(element.get_text(), level=3)
-                        elif element.name == 'h4':
-                            doc.add_heading(element.get_text(), level=4)
-
-                        elif element.name == 'p':
-                            # if element.get_text(strip=True):
-                            #     print("element.get_text() = ", element.get_text())
-                            #     doc.add_paragraph(element.get_text())
-                            paragraph = self.add_formatted_paragraph(doc,
-                                                                     "",
-                                                                     style='Body Text',
-                                                                     before=4,
-                                                                     after=4,
-                                                                     space_between=False)
-                            # paragraph = doc.add_paragraph()  # Create a paragraph in the docx
-                            for child in element.children:  # Traverse the direct children of <p>
-                                if child.name == 'a':  # Handle hyperlinks
-                                    href = child.get('href', '')
-                                    link_text = child.get_text(strip=True)
-                                    run = paragraph.add_run(link_text)
-                                    # run.font.underline = True  # Make the text underlined
-                                    # run.font.color.rgb = RGBColor(0, 0, 255)  # Make the text blue
-                                    paragraph.add_run(f" ({href})")  # Append the URL
-                                elif child.name == 'span':  # Handle spans and their content
-                                    for span_child in child.children:
-                                        if span_child.name == 'a':  # Handle links inside spans
-                                            href = span_child.get('href', '')
-                                            link_text = span_child.get_text(strip=True)
-                                            run = paragraph.add_run(link_text)
-                                            # run.font.underline = True
-                                            # run.font.color.rgb = RGBColor(0, 0, 255)
-                                            paragraph.add_run(f" ({href})")
-                                        elif span_child.string:  # Handle plain text inside spans
-                                            paragraph.add_run(span_child.string)
-                                elif child.string:  # Add plain text
-                                    paragraph.add_run(child.string)
-
-                        elif element.name == 'ul':  # Process unordered lists
-                            self.process_list(doc, element)
-
-                        elif element.name == 'ol':
-                            self.process_list(doc, element)
-
-                        elif element.name == 'img':
-                            img_src = element.get('src')
-                            if img_src:
-                                self.download_and_add_image(doc, img_src, element)
-                        elif element.name == 'iframe':
-                            map_src = element.get('src')
-                            if map_src and map_src.startswith("https://www.google.com/maps"):
-                                self.download_and_add_map_sshot(doc, title, map_src)
-            else:
-                logging.error(f"Failed to load post: {link} - Status Code: {response.status_code}")
+            images, maps = self.fetch_media(ir, stats, media)
+            stats.update(post_weight(ir, images, maps, self.image_width_inches))
+            return ir, images, maps, stats
+        except Exception as e:
+            logging.error(f"Error processing {self.post_url(post)}: {e}")
+            self.metrics.post(self.post_url(post), failed=True, **stats)
+            return None
+
+    def render_prepared(self, doc, post, prepared):
+        """
+        Adds a post prepared by prepare_post to the document.
+
+        :return: The images and maps the post pulled in and its weight (embedded bytes and
+                 estimated pages), or None if it could not be rendered.
+        """
+        if prepared is None:
+            return None
+        ir, images, maps, stats = prepared
+        try:
+            start = time.perf_counter()
+            pulled_in = self.render_post(doc, ir, images, maps)
+            stats['render_s'] = round(time.perf_counter() - start, 6)
+            self.metrics.post(self.post_url(post), title=ir['title'], **stats)
+            return {**pulled_in, 'bytes': stats['bytes'], 'pages': stats['pages']}
         except Exception as e:
-            logging.error(f"Error processing {link}: {e}")
+            logging.error(f"Error processing {self.post_url(post)}: {e}")
+            self.metrics.post(self.post_url(post), failed=True, **stats)
+            return None
+
+    def process_blog_post(self, doc, link):
+        return self.process_post(doc, link)
+
+    def new_media_registry(self):
+        return MediaRegistry(self.image_pipeline.canonical_url)
+
+    def fetch_images(self, srcs, media=None, stats=None):
+        """
+        Downloads images at the size they will be printed at (Blogger images are requested
+        resized, see ImagePipeline.request_url).
+
+        :param srcs: Image URLs as they appear in posts.
+        :param media: Optional MediaRegistry of the document, see fetch_media.
+        :param stats: Optional dict counting image_bytes downloaded and image_cache_hits
+                      (images reused from the registry count as neither).
+        :return: Image bytes by src, None for failed downloads.
+        """
+        request_urls = {src: self.image_pipeline.request_url(src) for src in srcs}
+        if media is not None:
+            return media.fetch_all(request_urls, lambda urls: self.image_fetcher.fetch_all(urls, stats))
+        fetched = self.image_fetcher.fetch_all(request_urls.values(), stats)
+        return {src: fetched[url] for src, url in request_urls.items()}
+
+    def fetch_media(self, ir, stats=None, media=None):
+        """
+        Downloads the images and captures the maps of a parsed post.
+
+        :param stats: Optional dict receiving images, image_bytes (downloaded over the network),
+                      image_cache_hits, images_s, maps and maps_s.
+        :param media: Optional MediaRegistry of the document the post goes into; images it
+                      already holds are reused instead of downloaded again.
+        :return: (images, maps): image bytes and map screenshots by src, None where one failed.
+        """
+        stats = {} if stats is None else stats
+        # prefetch every image in the post concurrently, then embed them in document order
+        start = time.perf_counter()
+        stats.update(image_bytes=0, image_cache_hits=0)
+        images = self.fetch_images(image_sources(ir), media, stats)
+        stats['images_s'] = round(time.perf_counter() - start, 6)
+        stats['images'] = len(images)
+        # likewise render every map embed in parallel across the driver pool
+        start = time.perf_counter()
+        maps = self.map_pool.capture_all(map_sources(ir))
+        stats['maps_s'] = round(time.perf_counter() - start, 6)
+        stats['maps'] = len(maps)
+        return images, maps
+
+    def render_post(self, doc, ir, images=None, maps=None):
+        """
+        Adds a parsed post, title first, to the document.
+
+        :param doc: A DocxDocument or a PdfDocument, see new_document.
+        :param ir: The post, as produced by PostParser.
+        :param images: Image bytes by src, see fetch_media; fetched here if not given.
+        :param maps: Map screenshots by src, see fetch_media; captured here if not given.
+        :return: The image and map URLs the post pulled in, see media_record.
+        """
+        if images is None or maps is None:
+            images, maps = self.fetch_media(ir)
+        return doc.add_post(ir, images, maps)
+
+    def render_settings(self):
+        """Options that change the rendered output; part of every output fingerprint."""
+        return {'render_version': RENDER_VERSION,
+                'ir_version': IR_VERSION,
+                'html_parser': self.html_parser,
+                'image_width_inches': self.image_width_inches,
+                'image_dpi': self.image_dpi,
+                'image_quality': self.image_quality,
+                'strip_image_metadata': self.strip_image_metadata,
+                'map_capture': [*self.map_size, self.map_format, self.map_quality],
+                'pdf_font_files': self.pdf_font_files,
+                'typography': self.typography.settings()}
+
+    def post_fingerprints(self, posts, loaded=None):
+        # scraped posts are downloaded and parsed to fingerprint them; do that in parallel
+        return list(run_ahead(lambda post: self.post_fingerprint(post, loaded), posts,
+                              self.pipeline_workers, self.pipeline_workers))
+
+    def output_fingerprint(self, urls, post_fingerprints):
+        """Version of an output file: the render settings and the versions of its posts, in order."""
+        return fingerprint(self.render_settings(), urls, post_fingerprints)
+
+    def open_manifest(self, output_dir):
+        """Manifest of the chunk files of create_travel_blog_docx_split in output_dir."""
+        return BuildManifest(os.path.join(output_dir, f"{self.file_name_starts_with}manifest.json"))
+
+    @staticmethod
+    def open_book_manifest(output_file):
+        """Manifest of a single book, apart from the chunk manifest so split builds leave the book alone."""
+        return BuildManifest(f"{os.path.splitext(output_file)[0]}.manifest.json")
+
+    def new_document(self, output_file):
+        """
+        An empty document for output_file: a DocxDocument, or for a .pdf a PdfDocument
+        writing the same layout straight to PDF (needs reportlab).
+        """
+        if output_file.lower().endswith(".pdf"):
+            from pdf_backend import PdfDocument  # reportlab is only needed for direct PDF output
+            return PdfDocument(output_file, typography=self.typography, image_width_inches=self.image_width_inches,
+                               font_files=self.pdf_font_files)
+        return DocxDocument(self, output_file)
+
+    def render_docx(self, output_file, posts, previous_fingerprint=None, heading=None, page_breaks=False,
+                    loaded=None):
+        """
+        Renders posts into a single .docx file, unless it was already built from the
+        same post versions. Touches no shared state, so it can run in a worker process.
+        A .pdf output_file is written directly, without a .docx or an office suite.
+
+        :param output_file: Path of the .docx (or .pdf) to write.
+        :param posts: Posts to render, as page URLs or API payloads.
+        :param previous_fingerprint: Fingerprint the existing file was built from, per the manifest.
+        :param heading: Optional level-1 heading at the top of the document.
+        :param page_breaks: Start every post after the first on a new page.
+        :param loaded: Optional dict of posts already parsed, see post_fingerprint.
+        :return: (fingerprint, post records) for the manifest, or None if the file was up to date.
+                 The fingerprint is None when some posts, images or maps failed, so the next
+                 run retries the file.
+        """
+        urls = [self.post_url(post) for post in posts]
+        output_name = os.path.basename(output_file)
+        # pages downloaded to fingerprint the posts are kept for rendering, with or without the HTTP cache
+        loaded = {} if loaded is None else loaded
+        with self.metrics.stage("fingerprint", output=output_name, posts=len(posts)):
+            post_fingerprints = self.post_fingerprints(posts, loaded)
+        output_fingerprint = self.output_fingerprint(urls, post_fingerprints)
+        if self.incremental and previous_fingerprint == output_fingerprint and os.path.exists(output_file):
+            logging.info(f"{output_file} is up to date, skipping")
+            return None
+
+        doc = self.new_document(output_file)
+        if heading:
+            doc.add_heading(heading, 1)
+
+        # posts are fetched, parsed and their media downloaded up to pipeline_depth posts
+        # ahead, while this thread adds them to the document in order
+        pulled_in = []
+        media = self.new_media_registry()  # images repeated across the posts are downloaded once
+        with self.metrics.stage("render", output=output_name, posts=len(posts)) as stage:
+            prepared_posts = run_ahead(lambda post: self.prepare_post(post, media, loaded), posts,
+                                       self.pipeline_workers, self.pipeline_depth)
+            for idx, prepared in enumerate(prepared_posts):
+                post = posts[idx]
+                if page_breaks and idx > 0:
+                    doc.add_page_break()
+                logging.info(f"Adding {self.post_url(post)}")
+                pulled_in.append(self.render_prepared(doc, post, prepared))
+            stage.update(images_downloaded=media.downloads, images_reused=media.reused)
+
+        with self.metrics.stage("save", output=output_name) as stage:
+            doc.save()
+            if doc.pages is not None:
+                stage['pages'] = doc.pages
+            stage['bytes'] = os.path.getsize(output_file)
+
+        return (output_fingerprint if self.is_complete(post_fingerprints, pulled_in) else None,
+                [{'url': url, 'fingerprint': post_fingerprint, **(pulled or {'images': [], 'maps': []})}
+                 for url, post_fingerprint, pulled in zip(urls, post_fingerprints, pulled_in)])
+
+    @staticmethod
+    def is_complete(post_fingerprints, pulled_in):
+        """True if every post of an output was rendered with all of its images and maps."""
+        return None not in post_fingerprints and all(pulled and not pulled['missing'] for pulled in pulled_in)
+
+    def build_docx(self, output_file, posts, manifest, heading=None, page_breaks=False, loaded=None):
+        """
+        Renders posts into output_file (see render_docx) and records the result in the manifest.
+
+        :return: True if the file was (re)built, False if it was up to date.
+        """
+        result = self.render_docx(output_file, posts, manifest.fingerprint_of(output_file), heading, page_breaks,
+                                  loaded)
+        if result is None:
+            return False
+        manifest.record_output(output_file, *result)
+        manifest.save()
+        return True
 
     def create_travel_blog_docx(self, output_docx_path, blog_post_list):
-        with open(blog_post_list, "r", encoding="utf-8") as file:
-            post_links = [line.strip() for line in file.readlines()]
+        posts = self.load_posts(blog_post_list)
+        manifest = self.open_book_manifest(output_docx_path)
+        self.build_docx(output_docx_path, posts, manifest, heading="Travel Blog Posts", page_breaks=True)
+
+    def create_travel_blog_pdf(self, output_pdf_path, blog_post_list):
+        """Writes the whole book straight to PDF, with the layout of create_travel_blog_docx."""
+        self.create_travel_blog_docx(output_pdf_path, blog_post_list)
+
+    def chunk_file(self, output_docx_path, idx):
+        return os.path.join(output_docx_path, f'{self.file_name_starts_with}{idx + 1:02}.docx')
+
+    def is_chunk_file(self, file_name):
+        """True if file_name is named like a chunk_file, e.g. travel_blog_posts_07.docx."""
+        number, extension = os.path.splitext(file_name[len(self.file_name_starts_with):])
+        return file_name.startswith(self.file_name_starts_with) and extension == '.docx' and number.isdigit()
+
+    def plan_chunks(self, posts, post_fingerprints, manifest):
+        """
+        Groups posts into output files: chunk_size posts per file, or, with a chunk budget,
+        as many posts as fit the budget. Budgeted plans use the post weights recorded by
+        the last build, up to the first post whose weight is not known (a new or changed
+        post, or one whose images did not all download); the file that post may still go
+        into and every file after it are left to build_chunks_streaming.
 
-        doc = Document()
-        doc.add_heading("Travel Blog Posts", level=1)
+        :param post_fingerprints: Versions of the posts, needed with a chunk budget only.
+        :return: (lists of posts, one per file, index of the first post not planned).
+        """
+        if not self.chunk_budget:
+            return [posts[i:i + self.chunk_size] for i in range(0, len(posts), self.chunk_size)], len(posts)
+        weights = []
+        for url, post_fingerprint in zip([self.post_url(post) for post in posts], post_fingerprints):
+            record = manifest.post_record(url, post_fingerprint)
+            if post_fingerprint is None or record is None or 'bytes' not in record or record.get('missing'):
+                break
+            weights.append({'bytes': record['bytes'], 'pages': record['pages']})
+        chunks = self.chunk_budget.plan(weights)
+        if len(weights) < len(posts) and chunks:
+            chunks.pop()  # the next post might still fit the last planned file
+        return [[posts[idx] for idx in chunk] for chunk in chunks], sum(len(chunk) for chunk in chunks)
+
+    def build_chunks_streaming(self, output_docx_path, posts, post_fingerprints, manifest, first_chunk=0,
+                               loaded=None):
+        """
+        Renders posts into budgeted chunk files as they arrive: a chunk is saved and released
+        as soon as the next post would not fit its budget, so at most one chunk (plus the
+        posts prepared ahead) is held in memory.
 
-        for idx, link in enumerate(post_links):
-            if idx > 0:
-                doc.add_page_break()
-            self.process_blog_post(doc, link)
+        :param first_chunk: Index of the first chunk file written (files before it were planned).
+        :param loaded: Optional dict of posts parsed while fingerprinting, see post_fingerprint.
+        :return: The chunk files written.
+        """
+        chunk_files = []
+        budget = self.chunk_budget
+        budget.reset()
+        doc, chunk = None, []
+
+        def flush():
+            doc_name = doc.output_file
+            chunk_files.append(doc_name)
+            with self.metrics.stage("save", output=os.path.basename(doc_name), posts=len(chunk),
+                                    budget_bytes=budget.used['bytes'],
+                                    budget_pages=round(budget.used['pages'], 2)) as stage:
+                doc.save()
+                stage['bytes'] = os.path.getsize(doc_name)
+            urls = [url for url, _, _ in chunk]
+            post_fingerprints = [post_fingerprint for _, post_fingerprint, _ in chunk]
+            complete = self.is_complete(post_fingerprints, [pulled for _, _, pulled in chunk])
+            manifest.record_output(doc_name,
+                                   self.output_fingerprint(urls, post_fingerprints) if complete else None,
+                                   [{'url': url, 'fingerprint': post_fingerprint,
+                                     **(pulled or {'images': [], 'maps': []})}
+                                    for url, post_fingerprint, pulled in chunk])
+            manifest.save()
+            budget.reset()
+            # posts prepared ahead keep their own images; the next file starts a registry afresh
+            media.clear()
 
-        self.set_font_to_aptos(doc)
-        doc.save(output_docx_path)
+        media = self.new_media_registry()
+        with self.metrics.stage("render", output=self.file_name_starts_with, posts=len(posts)) as stage:
+            prepared_posts = run_ahead(lambda post: self.prepare_post(post, media, loaded), posts,
+                                       self.pipeline_workers, self.pipeline_depth)
+            for idx, prepared in enumerate(prepared_posts):
+                post = posts[idx]
+                weight = {'bytes': prepared[3]['bytes'], 'pages': prepared[3]['pages']} if prepared \
+                    else {'bytes': 0, 'pages': 0.0}
+                if not budget.fits(weight):
+                    flush()
+                    doc, chunk = None, []  # the saved document and its images can go now
+                if doc is None:
+                    doc = self.new_document(self.chunk_file(output_docx_path, first_chunk + len(chunk_files)))
+                logging.info(f"Adding {self.post_url(post)}")
+                pulled = self.render_prepared(doc, post, prepared)
+                prepared = None  # the document holds its own copy of the images
+                chunk.append((self.post_url(post), post_fingerprints[idx], pulled))
+                budget.add(weight)
+            if chunk:
+                flush()
+            stage.update(images_downloaded=media.downloads, images_reused=media.reused)
+        return chunk_files
 
     def create_travel_blog_docx_split(self, output_docx_path, blog_post_list):
-        with open(blog_post_list, "r", encoding="utf-8") as file:
-            post_links = [line.strip() for line in file.readlines()]
+        posts = self.load_posts(blog_post_list)
+        manifest = self.open_manifest(output_docx_path)
 
-        chunks = [post_links[i:i + self.chunk_size] for i in range(0, len(post_links), self.chunk_size)]
+        post_fingerprints = None
+        loaded = {}  # posts parsed while fingerprinting, reused when their chunk is rendered
+        if self.chunk_budget:
+            with self.metrics.stage("fingerprint", output=self.file_name_starts_with, posts=len(posts)):
+                post_fingerprints = self.post_fingerprints(posts, loaded)
+        chunks, streamed_from = self.plan_chunks(posts, post_fingerprints, manifest)
+        chunk_files = [self.chunk_file(output_docx_path, idx) for idx in range(len(chunks))]
 
-        for idx, chunk in enumerate(chunks):
-            doc = Document()
+        if self.render_workers > 1 and len(chunks) > 1:
+            # every worker process builds its own extractor, with its own session and map drivers
+            with ProcessPoolExecutor(max_workers=min(self.render_workers, len(chunks)),
+                                     initializer=_init_render_worker,
+                                     initargs=(dict(self.init_kwargs, run_id=self.metrics.run_id, profile=False),)) as pool:
+                futures = {pool.submit(_render_docx_in_worker, doc_name, chunk, manifest.fingerprint_of(doc_name),
+                                       {self.post_url(post): loaded.pop(self.post_url(post))
+                                        for post in chunk if self.post_url(post) in loaded}): doc_name
+                           for doc_name, chunk in zip(chunk_files, chunks)}
+                for future in as_completed(futures):
+                    doc_name = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f"Failed to render {doc_name}: {e}")
+                        manifest.forget_output(doc_name)
+                        continue
+                    if result is not None:
+                        manifest.record_output(doc_name, *result)
+                        manifest.save()
+        else:
+            for doc_name, chunk in zip(chunk_files, chunks):
+                self.build_docx(doc_name, chunk, manifest, loaded=loaded)
 
-            for link in chunk:
-                self.process_blog_post(doc, link)
+        if streamed_from < len(posts):
+            # posts from the first one of unknown weight on (all of them on the first budgeted
+            # build) are chunked while rendering; their weights are recorded so the next build
+            # can plan these chunks up front too and skip the unchanged ones
+            chunk_files += self.build_chunks_streaming(output_docx_path, posts[streamed_from:],
+                                                       post_fingerprints[streamed_from:], manifest,
+                                                       first_chunk=len(chunks), loaded=loaded)
 
-            self.set_font_to_aptos(doc)
-            doc_name = os.path.join(output_docx_path, f'travel_blog_posts_{idx + 1:02}.docx')
-            doc.save(doc_name)
+        # remove chunks left over from an earlier build that had more of them
+        chunk_names = [os.path.basename(doc_name) for doc_name in chunk_files]
+        for name in manifest.outputs_starting_with(self.file_name_starts_with):
+            if self.is_chunk_file(name) and name not in chunk_names:
+                stale_file = os.path.join(output_docx_path, name)
+                if os.path.exists(stale_file):
+                    os.remove(stale_file)
+                manifest.forget_output(stale_file)
+        manifest.save()
 
     @staticmethod
-    def convert_docx_to_pdf(docx_file_path, pdf_file_path) -> str:
+    def is_pdf_up_to_date(docx_file, pdf_file):
+        """True if pdf_file exists and is newer than the docx it was converted from."""
+        return os.path.exists(pdf_file) and os.path.getmtime(pdf_file) >= os.path.getmtime(docx_file)
+
+    def pdf_converter(self):
+        """
+        Returns a LibreOfficeConverter when the pdf_backend calls for one, else None (docx2pdf).
+        'auto' picks LibreOffice wherever it is installed except on Windows and macOS,
+        where docx2pdf drives Microsoft Word.
+        """
+        backend = self.pdf_backend
+        if backend == "auto":
+            backend = "libreoffice" if sys.platform not in ("win32", "darwin") and find_soffice() else "docx2pdf"
+        if backend == "libreoffice":
+            return LibreOfficeConverter(workers=self.pdf_workers)
+        return None
+
+    def convert_docx_to_pdf(self, docx_file_path, pdf_file_path, skip_up_to_date=True) -> str:
         try:
-            convert(docx_file_path, pdf_file_path)
+            if skip_up_to_date and self.is_pdf_up_to_date(docx_file_path, pdf_file_path):
+                return f"{pdf_file_path} is up to date"
+            with self.metrics.stage("pdf", output=os.path.basename(pdf_file_path)):
+                converter = self.pdf_converter()
+                if converter is None:
+                    from docx2pdf import convert  # drives Microsoft Word; only needed for this backend
+                    convert(docx_file_path, pdf_file_path)
+                else:
+                    try:
+                        converter.convert(docx_file_path, pdf_file_path)
+                    finally:
+                        converter.close()
             return f"Successfully converted {docx_file_path} to {pdf_file_path}"
         except Exception as e:
             return f"Failed to convert {docx_file_path} to PDF: {e}"
 
-    @staticmethod
-    def convert_docx_to_pdf_multi(docx_path, pdf_path, file_name_starts_with):
+    def convert_docx_to_pdf_multi(self, docx_path, pdf_path, file_name_starts_with, skip_up_to_date=True):
+        """
+        Converts every docx chunk to PDF, in parallel when the LibreOffice backend is used.
+        Chunks skipped by an incremental build keep their old modification time, so with
+        skip_up_to_date only re-rendered chunks are converted.
+        """
         try:
-            for file_name in os.listdir(docx_path):
+            jobs = []
+            for file_name in sorted(os.listdir(docx_path)):
                 if file_name.startswith(file_name_starts_with) and file_name.endswith('.docx'):
                     docx_file = os.path.join(docx_path, file_name)
                     pdf_file = os.path.join(pdf_path, f"{os.path.splitext(file_name)[0]}.pdf")
-                    convert(docx_file, pdf_file)
-                    logging.info(f"Successfully converted {docx_file} to {pdf_file}")
+                    if skip_up_to_date and self.is_pdf_up_to_date(docx_file, pdf_file):
+                        logging.info(f"{pdf_file} is up to date, skipping")
+                        continue
+                    jobs.append((docx_file, pdf_file))
+
+            with self.metrics.stage("pdf", output=file_name_starts_with, files=len(jobs)):
+                converter = self.pdf_converter()
+                if converter is None:
+                    from docx2pdf import convert  # drives Microsoft Word; only needed for this backend
+                    for docx_file, pdf_file in jobs:
+                        convert(docx_file, pdf_file)
+                        logging.info(f"Successfully converted {docx_file} to {pdf_file}")
+                else:
+                    try:
+                        converter.convert_all(jobs)
+                    finally:
+                        converter.close()
         except Exception as e:
             logging.error(f"Failed to convert documents starting with {file_name_starts_with} to PDFs: {e}")
 
@@ -380,51 +1060,198 @@ class TravelBlogExtractor:
         closes the requests session to release resources
         """
         self.session.close()
+        if self.http_cache is not None:
+            self.http_cache.close()
 
     def close_driver(self):
-        """Closes the Selenium WebDriver to release resources."""
-        if self.driver:
-            self.driver.quit()
+        """Closes the Selenium WebDrivers to release resources."""
+        self.map_pool.close()
+
+    def close_metrics(self):
+        """Stops the profiler if one runs, then records and logs the end-of-run summary."""
+        self.metrics.close()
+
+# extractor owned by a chunk-rendering worker process
+_render_worker = None
 
-if __name__ == "__main__":
-    def log_execution(task_name, func, *args, **kwargs):
-        start_time = datetime.now()
-        logging.info(f"{start_time}: Starting {task_name}")
-        result = func(*args, **kwargs)
-        end_time = datetime.now()
-        logging.info(f"{end_time}: Completed {task_name} (Time taken: {(end_time - start_time).total_seconds()} seconds)")
-        return result
 
-    extractor = TravelBlogExtractor()
+def _init_render_worker(init_kwargs):
+    global _render_worker
+    _render_worker = TravelBlogExtractor(**init_kwargs)
+    # atexit does not run in pool workers; a multiprocessing finalizer does
+    multiprocessing.util.Finalize(None, _close_render_worker, exitpriority=10)
+
+
+def _close_render_worker():
+    _render_worker.close_session()
+    _render_worker.close_driver()
+    _render_worker.metrics.close(summarize=False)
+
+
+def _render_docx_in_worker(output_file, posts, previous_fingerprint, loaded=None):
+    return _render_worker.render_docx(output_file, posts, previous_fingerprint, loaded=loaded)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Turn the travel blog into Word documents and PDFs.")
+    parser.add_argument("--config", default="config.json", help="JSON file with BLOGGER_API_KEY and TRAVEL_BLOG_ID")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                        help="Directory for outputs, caches and the URL list unless given separately")
+    parser.add_argument("--urls-file", help="File the post URLs are written to and read from "
+                                            "(default: OUTPUT_DIR/blog_post_urls.txt)")
+    parser.add_argument("--offline", action="store_true", help="Serve pages and images from the HTTP cache only")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the persistent HTTP cache")
+    parser.add_argument("--metrics-file", help="JSON-lines file for timings (default: OUTPUT_DIR/metrics.jsonl)")
+    parser.add_argument("--profile", choices=["cprofile"], help="Profile the run and dump the stats next to the metrics")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="Write the URLs of every post to the URL list")
+    list_parser.add_argument("--sync-store", action="store_true",
+                             help="Also pull posts updated since the last sync into the local post store")
+
+    # options shared by the commands that render posts
+    posts_parser = argparse.ArgumentParser(add_help=False)
+    posts_parser.add_argument("--from-api", action="store_true",
+                              help="Render posts from the Blogger API listing instead of the URL list")
+    posts_parser.add_argument("--label", action="append", default=[],
+                              help="Pick posts from the local post store carrying this label (repeatable)")
+    posts_parser.add_argument("--since", help="Pick posts from the store published on or after this date")
+    posts_parser.add_argument("--until", help="Pick posts from the store published before this date")
+    posts_parser.add_argument("--search", help="Pick posts from the store matching this full-text query")
+    posts_parser.add_argument("--full", action="store_true", help="Rebuild outputs even if their posts are unchanged")
+    posts_parser.add_argument("--html-parser", choices=["html.parser", "lxml"],
+                              help="Parser for post pages (default: html.parser; lxml is faster if installed)")
+    # options of the commands that write .docx files
+    docx_parser = argparse.ArgumentParser(add_help=False)
+    docx_parser.add_argument("--pdf", action="store_true", help="Convert the documents to PDF afterwards")
+    docx_parser.add_argument("--pdf-backend", choices=["auto", "docx2pdf", "libreoffice"])
+
+    build_parser = commands.add_parser("build", parents=[posts_parser, docx_parser],
+                                       help="Render every post into one document")
+    build_parser.add_argument("--docx", help="Document to write (default: OUTPUT_DIR/travel_blog_posts.docx)")
+    build_parser.add_argument("--pdf-file", help="PDF to write with --pdf (default: the document with .pdf)")
+
+    build_pdf_parser = commands.add_parser("build-pdf", parents=[posts_parser],
+                                           help="Render every post straight to one PDF, without Word or LibreOffice")
+    build_pdf_parser.add_argument("--pdf-file", help="PDF to write (default: OUTPUT_DIR/travel_blog_posts.pdf)")
+    build_pdf_parser.add_argument("--font-file", action="append", default=[], dest="font_files",
+                                  help="TrueType file of the font: regular, then bold, italic and bold italic "
+                                       "(repeatable; Helvetica if not given)")
+
+    split_parser = commands.add_parser("build-split", parents=[posts_parser, docx_parser],
+                                       help="Render posts into numbered documents in the output directory")
+    split_parser.add_argument("--prefix", help="File name prefix of the documents (default: travel_blog_posts_)")
+    split_parser.add_argument("--chunk-size", type=int, help="Posts per document")
+    split_parser.add_argument("--chunk-max-bytes", type=int, help="Embedded image and map bytes per document")
+    split_parser.add_argument("--chunk-max-pages", type=float, help="Estimated pages per document")
+    split_parser.add_argument("--render-workers", type=int, help="Processes rendering documents in parallel")
+
+    convert_parser = commands.add_parser("convert", help="Convert documents built earlier to PDF")
+    convert_parser.add_argument("--split", action="store_true",
+                                help="Convert the numbered documents of build-split instead of the single one")
+    convert_parser.add_argument("--docx", help="Document to convert (default: OUTPUT_DIR/travel_blog_posts.docx)")
+    convert_parser.add_argument("--pdf-file", help="PDF to write (default: the document with .pdf)")
+    convert_parser.add_argument("--prefix", help="With --split: file name prefix of the documents")
+    convert_parser.add_argument("--pdf-backend", choices=["auto", "docx2pdf", "libreoffice"])
+    convert_parser.add_argument("--force", action="store_true", help="Convert even if the PDF is newer than the document")
+    return parser
+
+
+def extractor_kwargs(args):
+    """TravelBlogExtractor arguments for the parsed command line; options not given keep their defaults."""
+    output_dir = args.output_dir
+    kwargs = {
+        'config_file': args.config,
+        'blog_post_list': args.urls_file or os.path.join(output_dir, "blog_post_urls.txt"),
+        'output_docx_path': output_dir,
+        'output_docx_file': os.path.join(output_dir, "travel_blog_posts.docx"),
+        'map_cache_dir': os.path.join(output_dir, "map_cache"),
+        'cache_dir': None if args.no_cache else os.path.join(output_dir, "http_cache"),
+        'post_store_file': os.path.join(output_dir, "posts.sqlite3"),
+        'ir_cache_dir': os.path.join(output_dir, "post_ir"),
+        'metrics_file': args.metrics_file or os.path.join(output_dir, "metrics.jsonl"),
+        'offline': args.offline,
+        'profile': args.profile,
+    }
+    if getattr(args, 'docx', None):
+        kwargs['output_docx_file'] = args.docx
+    kwargs['output_pdf_file'] = getattr(args, 'pdf_file', None) or \
+        os.path.splitext(kwargs['output_docx_file'])[0] + ".pdf"
+    optional = {'prefix': 'file_name_starts_with', 'chunk_size': 'chunk_size', 'chunk_max_bytes': 'chunk_max_bytes',
+                'chunk_max_pages': 'chunk_max_pages', 'render_workers': 'render_workers', 'pdf_backend': 'pdf_backend',
+                'html_parser': 'html_parser'}
+    for option, name in optional.items():
+        if getattr(args, option, None) is not None:
+            kwargs[name] = getattr(args, option)
+    if getattr(args, 'font_files', None):
+        kwargs['pdf_font_files'] = args.font_files
+    if getattr(args, 'from_api', False):
+        kwargs['fetch_from_api'] = True
+    if getattr(args, 'full', False):
+        kwargs['incremental'] = False
+    if getattr(args, 'label', None) or getattr(args, 'since', None) or getattr(args, 'until', None) \
+            or getattr(args, 'search', None):
+        kwargs['post_query'] = {'labels': args.label, 'start': args.since, 'end': args.until, 'search': args.search}
+    return kwargs
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    extractor = TravelBlogExtractor(**extractor_kwargs(args))
+    # each task below is timed as a stage in extractor.metrics_file
+    log_execution = extractor.metrics.run
 
     try:
-        post_links = log_execution("get_travel_blog_urls", extractor.get_travel_blog_urls)
-
-        log_execution(
-            "Writing blog post URLs to file",
-            lambda: open(extractor.blog_post_list, "w", encoding="utf-8").writelines([link + "\n" for link in post_links])
-        )
-
-        # log_execution("create_travel_blog_docx",
-        #               extractor.create_travel_blog_docx,
-        #               extractor.output_docx_file,
-        #               extractor.blog_post_list)
-
-        # log_execution("convert_docx_to_pdf",
-        #               extractor.convert_docx_to_pdf,
-        #               extractor.output_docx_file,
-        #               extractor.output_pdf_file)
-
-        # log_execution("create_travel_blog_docx_split",
-        #               extractor.create_travel_blog_docx_split,
-        #               extractor.output_docx_path,
-        #               extractor.blog_post_list)
-
-        # log_execution("convert_docx_to_pdf_multi",
-        #               extractor.convert_docx_to_pdf_multi,
-        #               extractor.output_docx_path,
-        #               extractor.output_docx_path,
-        #               extractor.file_name_starts_with)
+        if args.command == "list":
+            if args.sync_store:
+                log_execution("sync_post_store", extractor.sync_post_store)
+            post_links = log_execution("get_travel_blog_urls", extractor.get_travel_blog_urls)
+            os.makedirs(os.path.dirname(extractor.blog_post_list) or ".", exist_ok=True)
+            with open(extractor.blog_post_list, "w", encoding="utf-8") as f:
+                f.writelines([link + "\n" for link in post_links])
+            logging.info(f"Wrote {len(post_links)} post URLs to {extractor.blog_post_list}")
+
+        elif args.command == "build":
+            os.makedirs(os.path.dirname(extractor.output_docx_file) or ".", exist_ok=True)
+            log_execution("create_travel_blog_docx",
+                          extractor.create_travel_blog_docx,
+                          extractor.output_docx_file,
+                          extractor.blog_post_list)
+            if args.pdf:
+                logging.info(extractor.convert_docx_to_pdf(extractor.output_docx_file, extractor.output_pdf_file))
+
+        elif args.command == "build-pdf":
+            os.makedirs(os.path.dirname(extractor.output_pdf_file) or ".", exist_ok=True)
+            log_execution("create_travel_blog_pdf",
+                          extractor.create_travel_blog_pdf,
+                          extractor.output_pdf_file,
+                          extractor.blog_post_list)
+
+        elif args.command == "build-split":
+            os.makedirs(extractor.output_docx_path, exist_ok=True)
+            log_execution("create_travel_blog_docx_split",
+                          extractor.create_travel_blog_docx_split,
+                          extractor.output_docx_path,
+                          extractor.blog_post_list)
+            if args.pdf:
+                extractor.convert_docx_to_pdf_multi(extractor.output_docx_path,
+                                                    extractor.output_docx_path,
+                                                    extractor.file_name_starts_with)
+
+        elif args.command == "convert":
+            if args.split:
+                extractor.convert_docx_to_pdf_multi(extractor.output_docx_path,
+                                                    extractor.output_docx_path,
+                                                    extractor.file_name_starts_with,
+                                                    skip_up_to_date=not args.force)
+            else:
+                logging.info(extractor.convert_docx_to_pdf(extractor.output_docx_file, extractor.output_pdf_file,
+                                                           skip_up_to_date=not args.force))
     finally:
         extractor.close_session()
         extractor.close_driver()
+        extractor.close_metrics()
+
+
+if __name__ == "__main__":
+    main()
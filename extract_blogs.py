@@ -1,3 +1,5 @@
+import argparse  # Import argparse to read the options from the command line
+import os  # Import os for building the default backup path
 import xml.etree.ElementTree as ET  # Import XML handling library
 from docx import Document  # Import library to create Word documents
 from bs4 import BeautifulSoup  # Import BeautifulSoup for parsing HTML
@@ -6,11 +8,12 @@ from docx.shared import Inches  # Import Inches for specifying image size in the
 from io import BytesIO  # Import BytesIO for handling image data in memory
 import html  # Import html to unescape HTML entities
 
-# Load XML file
-xml_file = "travel-blog-11-09-2024.xml"  # Path to the XML file containing blog entries
-tree = ET.parse(xml_file)  # Parse the XML file
-tree.getroot()  # Get the root element of the XML
-root = tree.getroot()  # Get the root element of the XML
+# Defaults for the command line options
+DEFAULT_XML_FILE = os.path.join("blog_backup", "blog-01-11-2025.xml")  # Blogger export containing blog entries
+DEFAULT_BLOG_ID_PREFIX = "tag:blogger.com,1999:blog-7121986992391433647.post"  # Only posts of this blog
+DEFAULT_TITLE_PREFIX = "Botswana 2024"  # Only posts whose title starts with this
+DEFAULT_OUTPUT_FILE = 'blog_entries_v04.docx'  # Path to save the Word document
+DEFAULT_HEADING = "First safari: blogs"  # Main heading of the document
 
 # Namespaces used in the XML
 namespaces = {
@@ -20,65 +23,162 @@ namespaces = {
     'thr': 'http://purl.org/syndication/thread/1.0'  # Thread namespace for comments and thread information
 }
 
-# Create a new Word document
-doc = Document()  # Create a new Word document
-doc.add_heading("First safari: blogs", level=1)  # Add a main heading to the document
-
-first_time = True # for the first level 2 header, we dont need a page break
-
-# Iterate through each <entry> element and extract relevant information
-for entry in root.findall('atom:entry', namespaces):  # Find all <entry> elements using the Atom namespace
-    entry_id = entry.find('atom:id', namespaces).text if entry.find('atom:id', namespaces) is not None else ''  # Get the <id> element text
-    if entry_id.startswith("tag:blogger.com,1999:blog-7121986992391433647.post"):  # Filter entries based on a specific blog ID prefix
-        title = entry.find('atom:title', namespaces).text if entry.find('atom:title', namespaces) is not None else 'No Title'  # Get the <title> element text
-        if title.startswith("Botswana 2024"):  # Further filter entries based on title
-            published = entry.find('atom:published', namespaces).text if entry.find('atom:published', namespaces) is not None else 'No Date'  # Get the <published> element text
-            content = entry.find('atom:content', namespaces).text if entry.find('atom:content', namespaces) is not None else 'No Content'  # Get the <content> element text
-            author = entry.find('atom:author/atom:name', namespaces).text if entry.find('atom:author/atom:name', namespaces) is not None else 'No Author'  # Get the author name
-            
-            # Replace HTML entities (&lt;, &gt;, etc.) with their corresponding characters
-            # content = html.unescape(content)  # Unescape HTML entities in the content
-            
-            # Use BeautifulSoup to parse content while retaining structure
-            soup = BeautifulSoup(content, 'html.parser')  # Parse the content using BeautifulSoup
-            
-            # Add entry to Word document
-            if first_time:
-                first_time = False
-            else:
-                doc.add_page_break()  # Start a new page for each blog entry
-            doc.add_heading(title, level=2)  # Add the title of the blog entry as a heading
-            doc.add_paragraph(f'Published: {published}')  # Add the publication date
-            doc.add_paragraph(f'Author: {author}')  # Add the author name
-            
-            # Iterate through the parsed HTML to retain headings, paragraphs, images, etc.
-            for element in soup.descendants:  # Iterate through all descendants of the parsed content
-                if element.name == 'h3':  # If the element is an <h3> heading
-                    doc.add_heading(element.get_text(), level=3)  # Add the <h3> text as a level-3 heading
-                elif element.name == 'p':  # If the element is a <p> paragraph
-                    # Add paragraph text if present
-                    if element.get_text(strip=True):  # Check if the paragraph contains text
-                        doc.add_paragraph(element.get_text())  # Add the paragraph text to the document
-                elif element.name == 'img':  # If the element is an <img> tag
-                    # Check for image links
-                    img_src = element.get('src')  # Get the 'src' attribute of the image
-                    if img_src and img_src.startswith("https://blogger.googleusercontent.com/"):  # Only process specific image URLs
-                        try:
-                            response = requests.get(img_src)  # Make an HTTP request to get the image
-                            if response.status_code == 200:  # Check if the request was successful
-                                image_stream = BytesIO(response.content)  # Create a BytesIO object from the image content
-                                doc.add_picture(image_stream, width=Inches(4.0))  # Add the image to the document with specified width
-                                
-                                # Add the image alt and title text if available
-                                alt_text = element.get('alt', 'No description available')  # Get the 'alt' attribute of the image
-                                title_text = element.get('title', 'No title available')  # Get the 'title' attribute of the image
-                                doc.add_paragraph(f'Image description: {alt_text}')  # Add the alt text below the image
-                                doc.add_paragraph(f'Image title: {title_text}')  # Add the title text below the image
-                        except Exception as e:  # Handle any errors that occur during the request
-                            print(f"Failed to download image: {img_src}, error: {e}")  # Print an error message
-
-# Save the Word document
-output_file = 'blog_entries_v04.docx' # Path to save the Word document
-doc.save(output_file)  # Save the Word document
-
-output_file  # Return the path of the saved Word document
+ENTRY_TAG = '{http://www.w3.org/2005/Atom}entry'  # Fully qualified tag of an <entry>, as iterparse reports it
+KIND_SCHEME = 'http://schemas.google.com/g/2005#kind'  # Category scheme telling posts from comments, settings, ...
+LABEL_SCHEME = 'http://www.blogger.com/atom/ns#'  # Category scheme of the post labels
+
+
+def find_text(entry, path, default):
+    """
+    Returns the text of the first element matching path, or default if there is none.
+
+    :param entry: The <entry> element.
+    :param path: Namespaced path of the child element, e.g. 'atom:title'.
+    :param default: Value returned when the element or its text is missing.
+    """
+    element = entry.find(path, namespaces)  # Look the element up only once
+    return element.text if element is not None and element.text is not None else default
+
+
+def iter_entries(xml_file, blog_id_prefix=DEFAULT_BLOG_ID_PREFIX, title_prefix=DEFAULT_TITLE_PREFIX):
+    """
+    Streams the entries of a Blogger export one at a time, applying the filters as
+    entries go past. Every entry is cleared once it has been handled, so memory stays
+    flat no matter how large the export is (template, settings, comments and all).
+
+    :param xml_file: Path of the Blogger export (Atom XML).
+    :param blog_id_prefix: Keep entries whose <id> starts with this; None keeps all.
+    :param title_prefix: Keep entries whose <title> starts with this; None keeps all.
+    :return: Generator of dicts with id, title, published, updated, content, author, kind, url and labels.
+    """
+    root = None
+    for event, element in ET.iterparse(xml_file, events=('start', 'end')):
+        if root is None:
+            root = element  # The <feed> element, whose finished children are dropped below
+            continue
+        if event != 'end' or element.tag != ENTRY_TAG:
+            continue
+
+        entry_id = find_text(element, 'atom:id', '')  # Get the <id> element text
+        if blog_id_prefix is None or entry_id.startswith(blog_id_prefix):  # Filter entries based on blog ID prefix
+            title = find_text(element, 'atom:title', 'No Title')  # Get the <title> element text
+            if title_prefix is None or title.startswith(title_prefix):  # Further filter entries based on title
+                kind = element.find(f"atom:category[@scheme='{KIND_SCHEME}']", namespaces)  # Post, comment, template, ...
+                link = element.find("atom:link[@rel='alternate']", namespaces)  # Public URL of the entry
+                yield {
+                    'id': entry_id,
+                    'title': title,
+                    'published': find_text(element, 'atom:published', 'No Date'),  # Get the <published> element text
+                    'updated': find_text(element, 'atom:updated', ''),  # Get the <updated> element text
+                    'content': find_text(element, 'atom:content', 'No Content'),  # Get the <content> element text
+                    'author': find_text(element, 'atom:author/atom:name', 'No Author'),  # Get the author name
+                    'kind': kind.get('term', '').rsplit('#', 1)[-1] if kind is not None else '',  # e.g. 'post'
+                    'url': link.get('href') if link is not None else None,
+                    'labels': [category.get('term') for category in
+                               element.findall(f"atom:category[@scheme='{LABEL_SCHEME}']", namespaces)],
+                }
+
+        root.clear()  # Release this entry (and anything before it) now that it has been handled
+
+
+def create_docx_from_backup(xml_file, output_file, heading=DEFAULT_HEADING,
+                            blog_id_prefix=DEFAULT_BLOG_ID_PREFIX, title_prefix=DEFAULT_TITLE_PREFIX):
+    """
+    Writes the matching entries of a Blogger export to a Word document.
+    """
+    return create_docx(iter_entries(xml_file, blog_id_prefix, title_prefix), output_file, heading)
+
+
+def create_docx(entries, output_file, heading=DEFAULT_HEADING):
+    """
+    Writes entries (from iter_entries or PostStore.select) to a Word document.
+    """
+    # Create a new Word document
+    doc = Document()  # Create a new Word document
+    doc.add_heading(heading, level=1)  # Add a main heading to the document
+
+    first_time = True # for the first level 2 header, we dont need a page break
+
+    # Iterate through each matching entry and extract relevant information
+    for entry in entries:
+        # Replace HTML entities (&lt;, &gt;, etc.) with their corresponding characters
+        # content = html.unescape(content)  # Unescape HTML entities in the content
+
+        # Use BeautifulSoup to parse content while retaining structure
+        soup = BeautifulSoup(entry['content'], 'html.parser')  # Parse the content using BeautifulSoup
+
+        # Add entry to Word document
+        if first_time:
+            first_time = False
+        else:
+            doc.add_page_break()  # Start a new page for each blog entry
+        doc.add_heading(entry['title'], level=2)  # Add the title of the blog entry as a heading
+        doc.add_paragraph(f"Published: {entry['published']}")  # Add the publication date
+        doc.add_paragraph(f"Author: {entry['author'] or 'No Author'}")  # Add the author name
+
+        # Iterate through the parsed HTML to retain headings, paragraphs, images, etc.
+        for element in soup.descendants:  # Iterate through all descendants of the parsed content
+            if element.name == 'h3':  # If the element is an <h3> heading
+                doc.add_heading(element.get_text(), level=3)  # Add the <h3> text as a level-3 heading
+            elif element.name == 'p':  # If the element is a <p> paragraph
+                # Add paragraph text if present
+                if element.get_text(strip=True):  # Check if the paragraph contains text
+                    doc.add_paragraph(element.get_text())  # Add the paragraph text to the document
+            elif element.name == 'img':  # If the element is an <img> tag
+                # Check for image links
+                img_src = element.get('src')  # Get the 'src' attribute of the image
+                if img_src and img_src.startswith("https://blogger.googleusercontent.com/"):  # Only process specific image URLs
+                    try:
+                        response = requests.get(img_src)  # Make an HTTP request to get the image
+                        if response.status_code == 200:  # Check if the request was successful
+                            image_stream = BytesIO(response.content)  # Create a BytesIO object from the image content
+                            doc.add_picture(image_stream, width=Inches(4.0))  # Add the image to the document with specified width
+
+                            # Add the image alt and title text if available
+                            alt_text = element.get('alt', 'No description available')  # Get the 'alt' attribute of the image
+                            title_text = element.get('title', 'No title available')  # Get the 'title' attribute of the image
+                            doc.add_paragraph(f'Image description: {alt_text}')  # Add the alt text below the image
+                            doc.add_paragraph(f'Image title: {title_text}')  # Add the title text below the image
+                    except Exception as e:  # Handle any errors that occur during the request
+                        print(f"Failed to download image: {img_src}, error: {e}")  # Print an error message
+
+    # Save the Word document
+    doc.save(output_file)  # Save the Word document
+    return output_file  # Return the path of the saved Word document
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write entries from a Blogger export to a Word document.")
+    parser.add_argument("--xml-file", default=DEFAULT_XML_FILE, help="Blogger export (Atom XML) to read")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FILE, help="Word document to write")
+    parser.add_argument("--heading", default=DEFAULT_HEADING, help="Main heading of the document")
+    parser.add_argument("--blog-id-prefix", default=DEFAULT_BLOG_ID_PREFIX,
+                        help="Keep entries whose id starts with this ('' keeps all)")
+    parser.add_argument("--title-prefix", default=DEFAULT_TITLE_PREFIX,
+                        help="Keep entries whose title starts with this ('' keeps all)")
+    parser.add_argument("--store", help="Pick the entries from this post store (SQLite) instead of scanning "
+                                        "the export; the export is indexed into the store first, unless its "
+                                        "size and modification time are unchanged since it was last indexed")
+    parser.add_argument("--reindex", action="store_true", help="With --store: index the export even if it looks unchanged")
+    parser.add_argument("--label", action="append", default=[],
+                        help="With --store: keep posts carrying this label (repeatable, all must match)")
+    parser.add_argument("--since", help="With --store: keep posts published on or after this date, e.g. 2024-06-01")
+    parser.add_argument("--until", help="With --store: keep posts published before this date")
+    parser.add_argument("--search", help="With --store: full-text query over titles and bodies, e.g. 'elephant'")
+    args = parser.parse_args()
+
+    if args.store:
+        from post_store import ATOM_BLOG_ID, PostStore  # Import the post store only when it is used
+        store = PostStore(args.store)
+        try:
+            store.index_backup(args.xml_file, force=args.reindex)  # Only posts changed since the last run are rewritten
+            blog_id = ATOM_BLOG_ID.search(args.blog_id_prefix) if args.blog_id_prefix else None
+            posts = store.select(labels=args.label, start=args.since, end=args.until,
+                                 title_prefix=args.title_prefix or None, search=args.search,
+                                 blog_id=blog_id.group(1) if blog_id else None)
+        finally:
+            store.close()
+        print(create_docx(posts, args.output, args.heading))
+    else:
+        print(create_docx_from_backup(args.xml_file, args.output, args.heading,
+                                      args.blog_id_prefix or None, args.title_prefix or None))
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import requests
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline mode when a URL has no cached copy."""
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response, carrying just what the extractor reads.
+    """
+
+    def __init__(self, url, status_code, content, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+
+
+class HttpCache:
+    """
+    Persistent HTTP cache keyed by URL. Bodies are stored once per content hash,
+    ETag / Last-Modified are remembered so later fetches can be conditional GETs,
+    and the total size is capped with least-recently-used eviction.
+
+    Layout under cache_dir:
+        index.sqlite3            url -> hash, validators, size, last access
+        objects/ab/abcdef...     response bodies named by their sha256
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, offline=False, fresh_for=300):
+        """
+        :param cache_dir: Directory holding the index and the stored bodies.
+        :param max_bytes: Size cap for the stored bodies; least recently used entries are evicted beyond it.
+        :param offline: Serve only from the cache and never touch the network.
+        :param fresh_for: Seconds after a successful fetch or revalidation during which
+                          the cached copy is served without asking the server again.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.fresh_for = fresh_for
+        # url -> monotonic time it was last confirmed with the server, for this process only
+        self._validated = {}
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        # one connection shared by the download threads, serialised by the lock;
+        # parallel render processes share the file, so wait on their locks rather than fail
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False, timeout=60)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                last_access REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash)")
+        self._db.commit()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _lookup(self, url):
+        with self._lock:
+            row = self._db.execute("SELECT hash, etag, last_modified FROM entries WHERE url = ?", (url,)).fetchone()
+        if row and os.path.exists(self._object_path(row[0])):
+            return row
+        return None
+
+    def _read(self, url, digest):
+        with open(self._object_path(digest), "rb") as f:
+            content = f.read()
+        with self._lock:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        return content
+
+    def _store(self, url, response):
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temp file first so a crash never leaves a truncated body behind
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (url, hash, size, etag, last_modified, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, len(content), response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"), time.time()))
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the stored bodies fit in max_bytes. Caller holds the lock."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT hash, size FROM entries)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for url, digest, size in self._db.execute(
+                "SELECT url, hash, size FROM entries ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            # bodies are shared between urls with identical content
+            if not self._db.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+                try:
+                    os.remove(self._object_path(digest))
+                except OSError:
+                    pass
+                total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+
+    def get(self, session, url, timeout=None):
+        """
+        Fetches a URL through the cache. A cached entry is revalidated with a
+        conditional GET; a 304 reply reuses the local copy.
+
+        :param session: The requests session used for network fetches.
+        :param url: The URL to fetch.
+        :param timeout: Request timeout in seconds.
+        :return: A response object with status_code, content and from_cache.
+        """
+        cached = self._lookup(url)
+
+        if self.offline:
+            if cached is None:
+                raise OfflineCacheMiss(f"No cached copy of {url}")
+            return CachedResponse(url, 200, self._read(url, cached[0]), from_cache=True)
+
+        if cached and time.monotonic() - self._validated.get(url, float("-inf")) < self.fresh_for:
+            return CachedResponse(url, 200, self._read(url, cached[0]), from_cache=True)
+
+        headers = {}
+        if cached:
+            digest, etag, last_modified = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            if cached is None:
+                raise
+            logging.warning(f"Revalidation of {url} failed ({e}), serving cached copy")
+            return CachedResponse(url, 200, self._read(url, cached[0]), from_cache=True)
+
+        if response.status_code == 304 and cached:
+            self._validated[url] = time.monotonic()
+            return CachedResponse(url, 200, self._read(url, cached[0]), from_cache=True)
+        if response.status_code == 200:
+            self._store(url, response)
+            self._validated[url] = time.monotonic()
+        response.from_cache = False
+        return response
+
+    def close(self):
+        with self._lock:
+            self._db.close()
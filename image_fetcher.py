@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from http_cache import OfflineCacheMiss
+
+# status codes worth another attempt; anything else (404, 403, ...) fails straight away
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ImageFetcher:
+    """
+    Downloads images concurrently through a bounded thread pool, with a limit on
+    how many requests hit the same host at once, plus timeouts and retries.
+    """
+
+    def __init__(self, session, max_workers=8, per_host_limit=4, timeout=30, max_retries=3, backoff=0.5,
+                 cache=None, transform=None):
+        """
+        :param session: The requests session used for every download.
+        :param max_workers: Size of the download thread pool.
+        :param per_host_limit: Maximum number of concurrent requests to a single host.
+        :param timeout: Timeout (in seconds) for each request.
+        :param max_retries: Number of attempts per image before giving up.
+        :param backoff: Base delay (in seconds) between attempts, doubled on every retry.
+        :param cache: Optional HttpCache that downloads are routed through.
+        :param transform: Optional callable applied to the downloaded bytes inside the worker
+                          thread (e.g. ImagePipeline.prepare), so only its result is kept in memory.
+        """
+        self.session = session
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.transform = transform
+
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        # urls that already used up their retries in this run are not tried again
+        self._failed = set()
+        self._stats_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def count(self, stats, response):
+        """Adds a successful response to stats: image_bytes received over the network, or an image_cache_hit."""
+        if stats is None:
+            return
+        with self._stats_lock:
+            if getattr(response, 'from_cache', False):
+                stats['image_cache_hits'] = stats.get('image_cache_hits', 0) + 1
+            else:
+                stats['image_bytes'] = stats.get('image_bytes', 0) + len(response.content)
+
+    def fetch(self, url, stats=None) -> Optional[bytes]:
+        """
+        Downloads a single image, retrying on timeouts, connection errors and
+        transient status codes.
+
+        :param url: The image URL.
+        :param stats: Optional dict counting image_bytes downloaded (as sent, before any
+                      transform) and image_cache_hits.
+        :return: The image bytes, or None if the download failed.
+        """
+        if url in self._failed:
+            return None
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with self._host_semaphore(url):
+                    if self.cache is not None:
+                        response = self.cache.get(self.session, url, timeout=self.timeout)
+                    else:
+                        response = self.session.get(url, timeout=self.timeout)
+                if response.status_code == 200:
+                    self.count(stats, response)
+                    if self.transform is not None:
+                        return self.transform(response.content)
+                    return response.content
+                if response.status_code not in RETRY_STATUS_CODES:
+                    logging.error(f"Failed to download image: {url} - Status Code: {response.status_code}")
+                    break
+                logging.warning(f"Attempt {attempt}/{self.max_retries} for {url} returned {response.status_code}")
+            except OfflineCacheMiss:
+                logging.error(f"Image not in cache (offline mode): {url}")
+                break
+            except requests.RequestException as e:
+                logging.warning(f"Attempt {attempt}/{self.max_retries} for {url} failed: {e}")
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+        else:
+            logging.error(f"Giving up on image after {self.max_retries} attempts: {url}")
+
+        self._failed.add(url)
+        return None
+
+    def fetch_all(self, urls: Iterable[str], stats=None) -> Dict[str, Optional[bytes]]:
+        """
+        Downloads a batch of images concurrently.
+
+        :param urls: Image URLs in document order; duplicates are fetched once.
+        :param stats: Optional dict counting downloaded bytes and cache hits, see fetch.
+        :return: Mapping of url -> image bytes (None for failed downloads), in document order.
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_urls))) as pool:
+            results = pool.map(lambda url: self.fetch(url, stats), unique_urls)
+            return dict(zip(unique_urls, results))
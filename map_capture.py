@@ -0,0 +1,272 @@
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+
+from PIL import Image
+
+# true once the document has loaded and every tile image has been fetched and decoded;
+# also reports how many resources the page has requested so far
+MAP_READY_SCRIPT = """
+const images = Array.from(document.images);
+return [
+    document.readyState === 'complete' && images.every(img => img.complete && img.naturalWidth > 0),
+    performance.getEntriesByType('resource').length
+];
+"""
+
+# replaces the blank page with the embed alone, in an iframe of exactly the capture size
+EMBED_SCRIPT = """
+const [src, width, height] = arguments;
+document.body.style.margin = '0';
+const frame = document.createElement('iframe');
+frame.src = src;
+frame.width = width;
+frame.height = height;
+frame.style.border = '0';
+frame.style.display = 'block';
+document.body.appendChild(frame);
+"""
+
+CAPTURE_FORMATS = ("png", "jpeg")
+
+
+class MapCapturePool:
+    """
+    Pool of headless Chrome drivers that screenshot Google Maps embeds in parallel.
+
+    Each map is loaded in an iframe of a fixed size and only that element is captured,
+    then re-encoded compactly (a 256-colour PNG, or a JPEG at a chosen quality). Instead
+    of sleeping for a fixed time, each capture waits until the map reports that all tile
+    images are decoded and no new resources have been requested for settle_time seconds.
+    Captures are cached on disk by embed URL, size and encoding, so a map that shows up
+    again (in the same run or a later one) is never rendered twice.
+    """
+
+    def __init__(self, size=2, render_timeout=30, settle_time=0.5, poll_interval=0.25,
+                 capture_size=(1200, 900), image_format="jpeg", quality=85, cache_dir=None):
+        """
+        :param size: Maximum number of Chrome instances running at once.
+        :param render_timeout: Maximum time (in seconds) to wait for a map to finish rendering.
+        :param settle_time: How long (in seconds) the page must stay quiet before it counts as rendered.
+        :param poll_interval: Delay (in seconds) between readiness checks.
+        :param capture_size: Size (width, height) of the captured map in device pixels.
+        :param image_format: Encoding of the captures, 'jpeg' or 'png'.
+        :param quality: JPEG quality of the captures.
+        :param cache_dir: Directory for cached captures; None disables the cache.
+        """
+        if image_format not in CAPTURE_FORMATS:
+            raise ValueError(f"Unknown capture format {image_format!r}, expected one of {CAPTURE_FORMATS}")
+        self.size = size
+        self.render_timeout = render_timeout
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.capture_size = tuple(capture_size)
+        self.image_format = image_format
+        self.quality = quality
+        self.cache_dir = cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        # drivers are started on demand, up to size, and handed out through the idle queue
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._started = 0
+        self._lock = threading.Lock()
+        self._driver_path = None
+        self._start_error = None
+
+    def _create_driver(self):
+        # selenium and webdriver_manager are slow to import; only runs that capture a map need them
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless=new')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        # one CSS pixel per device pixel, and a window with room for the whole iframe
+        options.add_argument('--force-device-scale-factor=1')
+        options.add_argument('--hide-scrollbars')
+        options.add_argument(f'--window-size={self.capture_size[0] + 100},{self.capture_size[1] + 100}')
+        if self._driver_path is None:
+            self._driver_path = ChromeDriverManager().install()
+        return webdriver.Chrome(service=Service(self._driver_path), options=options)
+
+    def _acquire(self):
+        while True:
+            if self._start_error is not None:
+                # Chrome could not be started; don't try again (and wait again) for every map
+                raise self._start_error
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            # reserve a slot under the lock but start Chrome outside it, so drivers start in parallel
+            with self._lock:
+                start_new = self._started < self.size
+                if start_new:
+                    self._started += 1
+            if start_new:
+                break
+            try:
+                # wake up now and then, in case a driver failed to start and freed its slot
+                return self._idle.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+
+        try:
+            driver = self._create_driver()
+        except Exception as e:
+            with self._lock:
+                self._started -= 1
+                self._start_error = e
+            raise
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+
+    def _release(self, driver):
+        self._idle.put(driver)
+
+    def _cache_path(self, map_src):
+        key = f"{map_src}|{self.capture_size[0]}x{self.capture_size[1]}|{self.image_format}|{self.quality}"
+        extension = "jpg" if self.image_format == "jpeg" else "png"
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.{extension}")
+
+    def _wait_until_rendered(self, driver):
+        """
+        Polls the page until tiles are loaded and the resource count has stopped
+        growing for settle_time seconds, or until render_timeout expires.
+        """
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        state = {"count": -1, "since": time.monotonic()}
+
+        def rendered(d):
+            ready, count = d.execute_script(MAP_READY_SCRIPT)
+            now = time.monotonic()
+            if count != state["count"]:
+                state["count"], state["since"] = count, now
+                return False
+            return ready and now - state["since"] >= self.settle_time
+
+        WebDriverWait(driver, self.render_timeout, poll_frequency=self.poll_interval).until(rendered)
+
+    def render(self, map_src) -> Optional[bytes]:
+        """
+        Loads a map embed in an iframe of capture_size and screenshots that element.
+
+        :param map_src: The iframe src of the Google Maps embed.
+        :return: PNG bytes as taken by Chrome, or None if the capture failed or the map had not
+                 finished rendering within render_timeout (a half-drawn map is not kept, so
+                 neither the capture cache nor the build manifest treats it as done).
+        """
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+
+        try:
+            driver = self._acquire()
+        except Exception as driver_e:
+            logging.error(f"Failed to start Chrome for map: {map_src}, error: {driver_e}")
+            return None
+
+        try:
+            logging.info(f"Loading map at {map_src}")
+            start_time = time.monotonic()
+            driver.get("about:blank")
+            driver.execute_script(EMBED_SCRIPT, map_src, *self.capture_size)
+            frame = driver.find_element(By.TAG_NAME, "iframe")
+            driver.switch_to.frame(frame)
+            try:
+                self._wait_until_rendered(driver)
+                logging.info(f" -> map rendered in {time.monotonic() - start_time:.1f}s")
+            except TimeoutException:
+                logging.error(f" -> map not rendered after {self.render_timeout}s, will retry on the next run: {map_src}")
+                return None
+            finally:
+                driver.switch_to.default_content()
+            return frame.screenshot_as_png
+        except Exception as map_e:
+            logging.error(f"Failed to download map: {map_src}, error: {map_e}")
+            return None
+        finally:
+            self._release(driver)
+
+    def encode(self, screenshot) -> bytes:
+        """
+        Re-encodes a capture as a palette PNG or a JPEG, scaled to capture_size if
+        Chrome returned it at another scale.
+        """
+        try:
+            with Image.open(BytesIO(screenshot)) as image:
+                image = image.convert("RGB")
+                if image.size != self.capture_size:
+                    image = image.resize(self.capture_size, Image.LANCZOS)
+                output = BytesIO()
+                if self.image_format == "jpeg":
+                    image.save(output, format="JPEG", quality=self.quality, optimize=True, progressive=True)
+                else:
+                    # maps are flat colours and text: a 256-colour palette keeps them crisp at a fraction of the size
+                    image.quantize(colors=256, method=Image.FASTOCTREE).save(output, format="PNG", optimize=True)
+        except Exception as e:
+            logging.warning(f"Could not re-encode map capture, keeping it as taken: {e}")
+            return screenshot
+        return output.getvalue()
+
+    def capture(self, map_src) -> Optional[bytes]:
+        """
+        Captures a single map embed, using the cached capture when there is one.
+
+        :param map_src: The iframe src of the Google Maps embed.
+        :return: JPEG or PNG bytes (see image_format), or None if the capture failed.
+        """
+        if self.cache_dir and os.path.exists(self._cache_path(map_src)):
+            with open(self._cache_path(map_src), "rb") as f:
+                return f.read()
+
+        screenshot = self.render(map_src)
+        if screenshot is None:
+            return None
+        capture = self.encode(screenshot)
+
+        if self.cache_dir:
+            # write then rename, as other processes may be capturing the same map
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(capture)
+            os.replace(tmp_path, self._cache_path(map_src))
+        return capture
+
+    def capture_all(self, map_srcs: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """
+        Screenshots a batch of map embeds in parallel across the pool.
+
+        :param map_srcs: Embed URLs in document order; duplicates are captured once.
+        :return: Mapping of embed URL -> image bytes (None for failed captures), in document order.
+        """
+        unique_srcs = list(dict.fromkeys(map_srcs))
+        if not unique_srcs:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(self.size, len(unique_srcs))) as pool:
+            return dict(zip(unique_srcs, pool.map(self.capture, unique_srcs)))
+
+    def close(self):
+        """Quits every driver the pool has started."""
+        with self._lock:
+            for driver in self._drivers:
+                try:
+                    driver.quit()
+                except Exception as e:
+                    logging.error(f"Failed to quit driver: {e}")
+            self._drivers = []
+            self._started = 0
+            self._idle = queue.Queue()
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional
+
+
+class MediaRegistry:
+    """
+    The images of one document, by canonical URL (see ImagePipeline.canonical_url) and by
+    content hash. An image that appears again, in the same post or a later one, is not
+    downloaded or processed again, and identical content is kept as a single bytes object.
+    python-docx embeds identical bytes as a single image part, so every repeat of an image
+    becomes another reference to the same part in the .docx.
+
+    Safe to share between the threads preparing posts ahead of the writer: an image still
+    being downloaded for one post is waited for, not requested again, by the next.
+    """
+
+    def __init__(self, canonical_url: Callable[[str], str] = lambda url: url):
+        """
+        :param canonical_url: Maps an image URL to the identity of the image it shows.
+        """
+        self.canonical_url = canonical_url
+        self._lock = threading.Lock()
+        self._media: Dict[str, Future] = {}
+        self._by_digest: Dict[str, bytes] = {}
+        self.downloads = 0
+        self.reused = 0
+
+    def fetch_all(self, request_urls: Dict[str, str],
+                  fetch_all: Callable[[Iterable[str]], Dict[str, Optional[bytes]]]) -> Dict[str, Optional[bytes]]:
+        """
+        Gets the images of a post, downloading only those not seen in this document yet.
+
+        :param request_urls: Image src -> URL to download it from, in document order.
+        :param fetch_all: Downloads a batch of URLs, e.g. ImageFetcher.fetch_all.
+        :return: Image bytes by src, None for failed downloads.
+        """
+        futures, owned = {}, {}
+        with self._lock:
+            for src, request_url in request_urls.items():
+                key = self.canonical_url(src)
+                if key in self._media:
+                    self.reused += 1
+                else:
+                    self._media[key] = Future()
+                    owned[request_url] = self._media[key]
+                futures[src] = self._media[key]
+            self.downloads += len(owned)
+
+        fetched = {}
+        try:
+            fetched = fetch_all(owned.keys()) if owned else {}
+        finally:
+            # resolve every claimed image, even on failure, so no other post waits forever
+            for request_url, future in owned.items():
+                future.set_result(self._share(fetched.get(request_url)))
+        return {src: future.result() for src, future in futures.items()}
+
+    def clear(self):
+        """Forgets every image, e.g. once the document holding them has been saved."""
+        with self._lock:
+            self._media.clear()
+            self._by_digest.clear()
+
+    def _share(self, content):
+        if content is None:
+            return None
+        digest = hashlib.sha1(content).hexdigest()
+        with self._lock:
+            return self._by_digest.setdefault(digest, content)
@@ -0,0 +1,207 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILERS = (None, "cprofile")
+POST_TIMINGS = ('fetch_s', 'parse_s', 'images_s', 'maps_s', 'render_s')
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MiB, or None where it cannot be read."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, "peak_wset", memory.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+class Metrics:
+    """
+    Structured timings of a run, one JSON object per line:
+
+        {"event": "stage", "stage": "save", "seconds": 1.2, "rss_peak_mb": 310.5, ...}
+        {"event": "post", "url": ..., "fetch_s": ..., "parse_s": ..., "images": 4, ...}
+        {"event": "summary", "stages": {...}, "slowest_posts": [...], ...}
+
+    Every record carries the run id, so one file can collect many runs (and the
+    records of worker processes, which share the run id of the main process).
+    """
+
+    def __init__(self, path=None, profile=None, profile_file=None, run_id=None, top=5):
+        """
+        :param path: JSON-lines file the records are appended to (and the summary is read back
+                     from); None keeps them in memory instead.
+        :param profile: None, or 'cprofile' to profile the run until close(): the thread that creates
+                        this object and every thread started meanwhile (pipeline, download and
+                        map threads), merged into one set of stats.
+        :param profile_file: Where the cProfile stats are dumped (defaults to the metrics file + '.prof').
+        :param run_id: Id stamped on every record; a new one is made if not given.
+        :param top: Number of slowest posts and stages listed in the summary.
+        """
+        if profile not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profile!r}, expected one of {PROFILERS}")
+        self.path = path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.top = top
+        self.records = []
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+        self.profile_file = profile_file or (f"{path}.prof" if path else "profile.prof")
+        self.profiler = None
+        self._thread_profilers = []
+        if profile == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            # before 3.12 a cProfile.Profile only sees the thread that enabled it, so every
+            # new thread gets its own; from 3.12 on one profiler covers all threads
+            if sys.version_info < (3, 12):
+                threading.setprofile(self._profile_thread)
+
+    def _profile_thread(self, frame, event, arg):
+        # called once, on the first event of a new thread; enabling replaces this hook in that thread
+        profiler = cProfile.Profile()
+        with self._lock:
+            if self.profiler is None:  # closed meanwhile
+                sys.setprofile(None)
+                return
+            self._thread_profilers.append(profiler)
+        profiler.enable()
+
+    def record(self, event, **fields):
+        """Appends a record; safe to call from any thread."""
+        record = {'event': event, 'run': self.run_id,
+                  'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), **fields}
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(record, default=str) + "\n")
+                self._file.flush()
+            else:
+                self.records.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Times the enclosed block as a stage, e.g. with metrics.stage("save", output=path): ...
+        The yielded dict can be filled with further fields while the stage runs.
+        """
+        start = time.perf_counter()
+        extra = dict(fields)
+        logging.info(f"Starting {name}")
+        try:
+            yield extra
+        finally:
+            seconds = time.perf_counter() - start
+            logging.info(f"Completed {name} (Time taken: {seconds:.3f} seconds)")
+            self.record('stage', stage=name, seconds=round(seconds, 6), rss_peak_mb=peak_rss_mb(), **extra)
+
+    def run(self, name, func, *args, **kwargs):
+        """Calls func as a stage named name and returns its result."""
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+    def post(self, url, **fields):
+        """Records the figures of one post (timings in seconds, counts, bytes)."""
+        return self.record('post', url=url, **fields)
+
+    def run_records(self):
+        """Every record of this run, including those of worker processes when a file is used."""
+        if self._file is None:
+            return list(self.records)
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('run') == self.run_id:
+                    records.append(record)
+        return records
+
+    def summary(self):
+        """Totals per stage, the slowest posts and overall counts, recorded and logged."""
+        records = self.run_records()
+        stages = {}
+        for record in records:
+            if record['event'] == 'stage':
+                total = stages.setdefault(record['stage'], {'count': 0, 'seconds': 0.0})
+                total['count'] += 1
+                total['seconds'] = round(total['seconds'] + record['seconds'], 6)
+        posts = [record for record in records if record['event'] == 'post']
+        for post in posts:
+            post['total_s'] = round(sum(post.get(timing) or 0 for timing in POST_TIMINGS), 6)
+        slowest = sorted(posts, key=lambda post: post['total_s'], reverse=True)[:self.top]
+        peaks = [record['rss_peak_mb'] for record in records if record.get('rss_peak_mb') is not None]
+
+        summary = self.record(
+            'summary',
+            stages=dict(sorted(stages.items(), key=lambda item: item[1]['seconds'], reverse=True)),
+            posts=len(posts),
+            images=sum(post.get('images', 0) for post in posts),
+            maps=sum(post.get('maps', 0) for post in posts),
+            page_bytes=sum(post.get('page_bytes', 0) for post in posts),
+            page_cache_hits=sum(1 for post in posts if post.get('page_cache_hit')),
+            image_bytes=sum(post.get('image_bytes', 0) for post in posts),
+            image_cache_hits=sum(post.get('image_cache_hits', 0) for post in posts),
+            post_timings={timing: round(sum(post.get(timing) or 0 for post in posts), 6) for timing in POST_TIMINGS},
+            slowest_posts=[{key: post.get(key) for key in ('url', 'total_s') + POST_TIMINGS} for post in slowest],
+            rss_peak_mb=max(peaks) if peaks else peak_rss_mb())
+
+        logging.info(f"Run {self.run_id}: {summary['posts']} posts, {summary['images']} images, {summary['maps']} maps, "
+                     f"peak RSS {summary['rss_peak_mb']} MiB")
+        for name, total in list(summary['stages'].items())[:self.top]:
+            logging.info(f"  stage {name}: {total['seconds']:.2f} s over {total['count']} call(s)")
+        for timing, seconds in summary['post_timings'].items():
+            logging.info(f"  posts {timing[:-2]}: {seconds:.2f} s in total")
+        for post in summary['slowest_posts']:
+            logging.info(f"  slow post {post['total_s']:.2f} s: {post['url']}")
+        return summary
+
+    def close(self, summarize=True):
+        """Stops the profiler (dumping its stats), writes the summary and closes the file."""
+        if self.profiler is not None:
+            threading.setprofile(None)
+            self.profiler.disable()
+            with self._lock:
+                thread_profilers, self._thread_profilers = self._thread_profilers, []
+                profiler, self.profiler = self.profiler, None
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            for thread_profiler in thread_profilers:
+                try:
+                    stats.add(thread_profiler)
+                except Exception as e:  # a profiler that recorded nothing has no stats
+                    logging.debug(f"Skipping thread profile: {e}")
+            stats.dump_stats(self.profile_file)
+            stats.sort_stats("cumulative").print_stats(25)
+            logging.info(f"Profile of {1 + len(thread_profilers)} threads written to {self.profile_file}\n"
+                         f"{report.getvalue()}")
+        if summarize:
+            self.summary()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,256 @@
+import logging
+from io import BytesIO
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Frame, Image, Paragraph, Spacer
+
+from post_ir import media_record
+
+# page setup of the default docx template: Letter, 1" top and bottom, 1.25" side margins
+PAGE_MARGINS_INCHES = (1.0, 1.25, 1.0, 1.25)  # top, right, bottom, left
+# the default template's look: 11pt text at 1.15 line spacing, blue bold headings
+BODY_SIZE = 11
+LINE_SPACING = 1.15
+HEADING_SIZES = {1: 14, 2: 13, 3: 11, 4: 11}
+HEADING_COLORS = {1: "#365F91", 2: "#4F81BD", 3: "#4F81BD", 4: "#4F81BD"}
+HEADING_SPACE_BEFORE = {1: 24, 2: 10, 3: 10, 4: 10}
+CAPTION_SIZE = 9
+CAPTION_COLOR = "#4F81BD"
+LIST_INDENT_INCHES = 0.25
+BUILTIN_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique")
+
+
+def register_font_family(name, font_files):
+    """
+    Registers TrueType fonts under name for use in the PDF.
+
+    :param font_files: (regular, bold, italic, bold italic) .ttf paths; missing faces fall back to regular.
+    :return: The (regular, bold, italic, bold italic) font names to use.
+    """
+    faces = list(font_files) + [None] * (4 - len(font_files))
+    names = []
+    for suffix, path in zip(("", "-Bold", "-Italic", "-BoldItalic"), faces):
+        if path:
+            pdfmetrics.registerFont(TTFont(name + suffix, path))
+            names.append(name + suffix)
+        else:
+            names.append(name)
+    pdfmetrics.registerFontFamily(name, normal=names[0], bold=names[1], italic=names[2], boldItalic=names[3])
+    return tuple(names)
+
+
+class PdfDocument:
+    """
+    Writes posts in their intermediate form (see PostParser) straight to a PDF, with the
+    layout of the docx backend: headings, body paragraphs, bulleted and numbered lists,
+    centered images and maps with their captions. Blocks are laid out one after another
+    and every page is closed as soon as it is full, so only finished page streams (and
+    each image once, JPEGs as they are, without re-encoding) are held until save()
+    writes the file; reportlab assembles the PDF in memory.
+    """
+
+    def __init__(self, output_file, typography=None, image_width_inches=6.0, font_files=None,
+                 pagesize=LETTER, margins_inches=PAGE_MARGINS_INCHES):
+        """
+        :param output_file: Path of the PDF to write.
+        :param typography: Typography whose spacing is used (fonts need font_files, see below).
+        :param image_width_inches: Printed width of images and maps.
+        :param font_files: Optional (regular, bold, italic, bold italic) .ttf files of the
+                           typography font; the built-in Helvetica is used otherwise.
+        :param pagesize: Page (width, height) in points.
+        :param margins_inches: (top, right, bottom, left) page margins.
+        """
+        self.output_file = output_file
+        self.image_width = image_width_inches * inch
+        self.pagesize = pagesize
+        top, right, bottom, left = (margin * inch for margin in margins_inches)
+        self.frame_box = (left, bottom, pagesize[0] - left - right, pagesize[1] - top - bottom)
+
+        if font_files and typography is not None:
+            fonts = register_font_family(typography.font_name, font_files)
+        else:
+            fonts = BUILTIN_FONTS
+        body_spacing = typography.body_spacing if typography is not None else (4, 4)
+        list_spacing = typography.list_spacing if typography is not None else (3, 3)
+        caption_spacing = typography.caption_spacing if typography is not None else (0, 6)
+        self.styles = self.make_styles(fonts, body_spacing, list_spacing, caption_spacing)
+
+        self.canvas = Canvas(output_file, pagesize=pagesize, pageCompression=1)
+        self.pages = 0
+        self.new_page()
+
+    @staticmethod
+    def make_styles(fonts, body_spacing, list_spacing, caption_spacing):
+        regular, bold, italic, bold_italic = fonts
+        leading = BODY_SIZE * LINE_SPACING + 1
+        body = ParagraphStyle('Body Text', fontName=regular, fontSize=BODY_SIZE, leading=leading,
+                              spaceBefore=body_spacing[0], spaceAfter=body_spacing[1])
+        styles = {
+            'body': body,
+            'figure': ParagraphStyle('Figure', parent=body, alignment=TA_CENTER),
+            'caption': ParagraphStyle('Caption', parent=body, fontName=bold, fontSize=CAPTION_SIZE,
+                                      leading=CAPTION_SIZE * LINE_SPACING + 1, alignment=TA_CENTER,
+                                      textColor=HexColor(CAPTION_COLOR),
+                                      spaceBefore=caption_spacing[0], spaceAfter=caption_spacing[1]),
+        }
+        for level, size in HEADING_SIZES.items():
+            styles[f'heading{level}'] = ParagraphStyle(
+                f'Heading {level}', parent=body, fontName=bold_italic if level == 4 else bold, fontSize=size,
+                leading=size * LINE_SPACING + 1, textColor=HexColor(HEADING_COLORS[level]),
+                spaceBefore=HEADING_SPACE_BEFORE[level], spaceAfter=0)
+        for level in range(5):
+            indent = LIST_INDENT_INCHES * (level + 1) * inch
+            styles[f'list{level}'] = ParagraphStyle(
+                f'List {level + 1}', parent=body, leftIndent=indent, bulletIndent=indent - LIST_INDENT_INCHES * inch,
+                spaceBefore=list_spacing[0], spaceAfter=list_spacing[1])
+        return styles
+
+    def new_page(self):
+        x, y, width, height = self.frame_box
+        self.frame = Frame(x, y, width, height, leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0,
+                           showBoundary=0)
+        self.page_empty = True
+
+    def add_page_break(self):
+        """Finishes the current page (unless nothing is on it yet)."""
+        if not self.page_empty:
+            self.canvas.showPage()
+            self.pages += 1
+            self.new_page()
+
+    def space_left(self):
+        return self.frame._y - self.frame._y1p
+
+    def add(self, *flowables, keep_after=0):
+        """
+        Lays out flowables in order, splitting paragraphs across pages. Flowables given
+        together (an image and its caption) start a new page unless they all fit.
+
+        :param keep_after: Room (in points) to leave below the flowables, or start a new
+                           page; keeps a heading with the first lines that follow it.
+        """
+        if (len(flowables) > 1 or keep_after) and not self.page_empty:
+            width = self.frame_box[2]
+            needed = sum(flowable.wrap(width, self.frame_box[3])[1] + flowable.getSpaceBefore()
+                         + flowable.getSpaceAfter() for flowable in flowables)
+            if needed + keep_after > self.space_left():
+                self.add_page_break()
+
+        pending = list(flowables)
+        while pending:
+            flowable = pending.pop(0)
+            if self.frame.add(flowable, self.canvas):
+                self.page_empty = False
+                continue
+            parts = self.frame.split(flowable, self.canvas)
+            if len(parts) > 1:
+                pending[:0] = parts
+                continue
+            if self.page_empty:
+                logging.warning(f"Dropping {type(flowable).__name__} too large for a page")
+                continue
+            self.add_page_break()
+            pending.insert(0, flowable)
+
+    @staticmethod
+    def markup(runs):
+        """Paragraph markup of intermediate runs; links are followed by their URL, as in the docx."""
+        parts = []
+        for run in runs:
+            if isinstance(run, str):
+                parts.append(escape(run).replace("\n", "<br/>"))
+            else:
+                if run['text']:
+                    parts.append(escape(run['text']))
+                if run['href']:
+                    href = escape(run['href'], {'"': '&quot;'})
+                    parts.append(f' (<a href="{href}">{escape(run["href"])}</a>)')
+        return "".join(parts)
+
+    def paragraph(self, markup, style):
+        if not markup.strip():
+            # an empty paragraph still takes a line, as in Word
+            return Spacer(1, style.leading + style.spaceBefore + style.spaceAfter)
+        return Paragraph(markup, style)
+
+    def image(self, content) -> Optional[Image]:
+        """A centered image flowable at the printed width, shrunk if taller than a page."""
+        try:
+            width, height = ImageReader(BytesIO(content)).getSize()
+        except Exception as e:
+            logging.error(f"Failed to add image: {e}")
+            return None
+        printed_width = self.image_width
+        printed_height = printed_width * height / width
+        max_height = self.frame_box[3] - self.styles['figure'].spaceBefore - self.styles['figure'].spaceAfter
+        if printed_height > max_height:
+            printed_width, printed_height = printed_width * max_height / printed_height, max_height
+        image = Image(BytesIO(content), width=printed_width, height=printed_height)
+        image.hAlign = 'CENTER'
+        image.spaceBefore = self.styles['figure'].spaceBefore
+        image.spaceAfter = self.styles['figure'].spaceAfter
+        return image
+
+    def add_heading(self, text, level):
+        body = self.styles['body']
+        self.add(self.paragraph(escape(text), self.styles[f'heading{min(max(level, 1), 4)}']),
+                 keep_after=2 * body.leading + body.spaceBefore)
+
+    def add_post(self, ir, images: Dict[str, Optional[bytes]], maps: Dict[str, Optional[bytes]]):
+        """
+        Adds a parsed post, title first.
+
+        :param images: Image bytes by src, None for failed downloads.
+        :param maps: Map captures by src, None for failed captures.
+        :return: The image and map URLs the post pulled in, see media_record.
+        """
+        self.add_heading(ir['title'], 2)
+        numbers = {}  # numbering of the current ordered list, per level
+        for block in ir['blocks']:
+            kind = block['type']
+            if kind != 'list_item':
+                numbers = {}
+            if kind == 'heading':
+                self.add_heading(block['text'], block['level'])
+            elif kind == 'paragraph':
+                self.add(self.paragraph(self.markup(block['runs']), self.styles['body']))
+            elif kind == 'list_item':
+                level = min(block['level'], 4)
+                numbers = {lvl: number for lvl, number in numbers.items() if lvl <= level}
+                if block['ordered']:
+                    numbers[level] = numbers.get(level, 0) + 1
+                    bullet = f"{numbers[level]}."
+                else:
+                    bullet = "•"
+                markup = self.markup(block['runs'])
+                self.add(Paragraph(markup, self.styles[f'list{level}'], bulletText=bullet))
+            elif kind in ('image', 'map'):
+                content = (images if kind == 'image' else maps).get(block['src'])
+                if content is None:
+                    logging.error(f"Failed to download {kind}: {block['src']}")
+                    continue
+                image = self.image(content)
+                if image is None:
+                    continue
+                caption = block.get('caption')
+                if caption:
+                    self.add(image, self.paragraph(escape(caption), self.styles['caption']))
+                else:
+                    self.add(image)
+        return media_record(images, maps)
+
+    def save(self):
+        """Finishes the last page and writes the PDF."""
+        if not self.page_empty:
+            self.pages += 1
+        self.canvas.save()
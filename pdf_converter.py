@@ -0,0 +1,102 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+SOFFICE_NAMES = ("soffice", "libreoffice")
+
+
+def find_soffice():
+    """Returns the path of the LibreOffice binary, or None if it is not installed."""
+    for name in SOFFICE_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+class LibreOfficeConverter:
+    """
+    Converts .docx files to PDF with headless LibreOffice, several files at a time.
+
+    LibreOffice hands a conversion to any instance already running on the same user
+    profile, which serialises everything behind one process. Each worker slot therefore
+    owns a private profile directory that is created on first use and reused for every
+    later file, so the slots convert truly in parallel and only the first conversion in
+    a slot pays for profile initialisation.
+    """
+
+    def __init__(self, workers=None, soffice=None, timeout=600):
+        """
+        :param workers: Number of LibreOffice instances converting at once (defaults to the CPU count).
+        :param soffice: Path of the soffice binary; looked up on PATH if not given.
+        :param timeout: Maximum time (in seconds) a single conversion may take.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.soffice = soffice or find_soffice()
+        if not self.soffice:
+            raise FileNotFoundError("LibreOffice (soffice) was not found on PATH")
+        self.timeout = timeout
+
+        self._root = tempfile.mkdtemp(prefix="ghost_writer_lo_")
+        self._slots = queue.Queue()
+        for slot in range(self.workers):
+            self._slots.put(os.path.join(self._root, f"slot_{slot}"))
+
+    def convert(self, docx_file, pdf_file):
+        """
+        Converts a single file using whichever worker slot is free.
+
+        :raises RuntimeError: If LibreOffice fails or produces no PDF.
+        """
+        slot = self._slots.get()
+        try:
+            profile_dir = os.path.join(slot, "profile")
+            out_dir = os.path.join(slot, "out")
+            os.makedirs(out_dir, exist_ok=True)
+            result = subprocess.run(
+                [self.soffice,
+                 f"-env:UserInstallation={Path(profile_dir).absolute().as_uri()}",
+                 "--headless", "--norestore", "--nologo",
+                 "--convert-to", "pdf", "--outdir", out_dir, os.path.abspath(docx_file)],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
+            produced = os.path.join(out_dir, f"{Path(docx_file).stem}.pdf")
+            if result.returncode != 0 or not os.path.exists(produced):
+                raise RuntimeError(f"soffice exited with {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+            # the slot lives in the temp directory, often another filesystem (tmpfs) than the output
+            shutil.move(produced, pdf_file)
+        finally:
+            self._slots.put(slot)
+
+    def convert_all(self, jobs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str, bool]]:
+        """
+        Converts many files in parallel across the worker slots.
+
+        :param jobs: (docx_file, pdf_file) pairs.
+        :return: (docx_file, pdf_file, succeeded) for every job, in the order given.
+        """
+        jobs = list(jobs)
+
+        def run(job):
+            docx_file, pdf_file = job
+            try:
+                self.convert(docx_file, pdf_file)
+                logging.info(f"Successfully converted {docx_file} to {pdf_file}")
+                return docx_file, pdf_file, True
+            except Exception as e:
+                logging.error(f"Failed to convert {docx_file} to PDF: {e}")
+                return docx_file, pdf_file, False
+
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+            return list(pool.map(run, jobs))
+
+    def close(self):
+        """Removes the worker profiles."""
+        shutil.rmtree(self._root, ignore_errors=True)
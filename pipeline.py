@@ -0,0 +1,36 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def run_ahead(func: Callable[[T], R], items: Iterable[T], workers=4, depth=8) -> Iterator[R]:
+    """
+    Applies func to items on a thread pool while the caller consumes the results, in the
+    order of items. At most depth results are computed ahead of the caller: once that many
+    are waiting, no new item is started until the caller takes the next result, which keeps
+    memory bounded however slow the consumer is.
+
+    :param func: Work done ahead, e.g. downloading and parsing a post; should not raise.
+    :param items: The inputs, consumed lazily.
+    :param workers: Threads running func.
+    :param depth: Maximum number of items started but not yet handed to the caller.
+    :return: Generator of func(item) for every item, in order.
+    """
+    depth = max(1, depth)
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, depth))) as pool:
+        try:
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # the caller stopped early: don't start what is still queued
+            for future in pending:
+                future.cancel()
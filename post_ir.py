@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import re
+import tempfile
+
+from bs4 import BeautifulSoup, NavigableString
+from bs4.element import PreformattedString
+
+from build_manifest import fingerprint
+
+# bump when a change to the parser should invalidate every cached post
+IR_VERSION = 3
+
+WHITESPACE = re.compile(r"\s+")
+
+# tag -> PostParser method turning it into blocks; None skips the element and its subtree.
+# Tags not listed are containers whose children are visited in turn.
+BLOCK_HANDLERS = {
+    'h1': 'parse_heading',
+    'h2': 'parse_heading',
+    'h3': 'parse_heading',
+    'h4': 'parse_heading',
+    'p': 'parse_paragraph',
+    'ul': 'parse_list',
+    'ol': 'parse_list',
+    'img': 'parse_image',
+    'iframe': 'parse_iframe',
+    'table': 'parse_table',
+    'script': None,
+    'style': None,
+}
+
+
+def is_map_embed(src):
+    return bool(src) and src.startswith("https://www.google.com/maps")
+
+
+def image_sources(ir):
+    """The image URLs of a post, in document order."""
+    return [block['src'] for block in ir['blocks'] if block['type'] == 'image']
+
+
+def map_sources(ir):
+    """The map embed URLs of a post, in document order."""
+    return [block['src'] for block in ir['blocks'] if block['type'] == 'map']
+
+
+def media_record(images, maps):
+    """
+    What a rendered post pulled in, for the build manifest: the images and maps that were
+    embedded, and under 'missing' those that failed to download or capture.
+    """
+    return {'images': [src for src, content in images.items() if content is not None],
+            'maps': [src for src, content in maps.items() if content is not None],
+            'missing': [src for media in (images, maps) for src, content in media.items() if content is None]}
+
+
+class RunWriter:
+    """
+    Appends inline runs to the text block currently open, opening one on demand.
+    Plain text runs are merged; links are kept as {'text', 'href'} runs.
+    """
+
+    def __init__(self, open_block):
+        """
+        :param open_block: Callable appending a new, empty text block to the post and returning it.
+        """
+        self.open_block = open_block
+        self.block = None
+        self.at_line_start = True
+
+    def open(self):
+        self.block = self.open_block()
+        self.at_line_start = True
+
+    def write(self, text):
+        if self.at_line_start:
+            text = text.lstrip(" ")
+        if not text:
+            return
+        if self.block is None:
+            self.open()
+        runs = self.block['runs']
+        if runs and isinstance(runs[-1], str):
+            runs[-1] += text
+        else:
+            runs.append(text)
+        self.at_line_start = text.endswith("\n")
+
+    def write_link(self, text, href):
+        if not text and not href:
+            return
+        if self.block is None:
+            self.open()
+        self.block['runs'].append({'text': text, 'href': href})
+        self.at_line_start = False
+
+    def close(self):
+        self.block = None
+        self.at_line_start = True
+
+
+class PostParser:
+    """
+    Turns the HTML of a post into its intermediate representation: a JSON-serialisable
+    dict holding the title and a flat list of blocks, each one of
+
+        {'type': 'heading', 'level': 1-4, 'text': str}
+        {'type': 'paragraph', 'runs': [run, ...]}
+        {'type': 'list_item', 'ordered': bool, 'level': int, 'runs': [run, ...]}
+        {'type': 'image', 'src': str, 'caption': str}
+        {'type': 'map', 'src': str}
+
+    where a run is a plain string (which may contain '\\n' line breaks) or a link
+    {'text': str, 'href': str}. An image caption is the one shown under it on the blog, else
+    its title or alt text. Backends (see TravelBlogExtractor.render_ir) render it
+    without looking at the HTML again.
+    """
+
+    def __init__(self, html_parser='html.parser'):
+        """
+        :param html_parser: BeautifulSoup parser used for HTML strings.
+        """
+        self.html_parser = html_parser
+
+    def parse_html(self, title, html):
+        return self.parse(title, BeautifulSoup(html or '', self.html_parser))
+
+    def parse(self, title, post_body):
+        """
+        :param title: The post title.
+        :param post_body: Parsed HTML of the post body (may be None).
+        :return: The intermediate representation of the post.
+        """
+        blocks = []
+        if post_body:
+            self.parse_block(post_body, blocks)
+        return {'version': IR_VERSION, 'title': title, 'blocks': blocks}
+
+    def parse_block(self, element, blocks):
+        """
+        Visits the children of a block-level element exactly once, dispatching each
+        tag through BLOCK_HANDLERS. Containers such as <div> are walked recursively;
+        text lying directly in a container (outside any <p>) is dropped.
+        """
+        for child in element.children:
+            if child.name is None:
+                continue
+            handler = BLOCK_HANDLERS.get(child.name, 'parse_block')
+            if handler:
+                getattr(self, handler)(child, blocks)
+
+    def parse_heading(self, element, blocks):
+        blocks.append({'type': 'heading', 'level': int(element.name[1]), 'text': " ".join(element.get_text().split())})
+
+    def parse_paragraph(self, element, blocks):
+        writer = RunWriter(lambda: self.add_text_block(blocks, {'type': 'paragraph'}))
+        writer.open()  # every <p> gives a paragraph, even an empty one used for spacing
+        self.parse_inline(element, blocks, writer)
+
+    def parse_list(self, element, blocks, level=0):
+        """
+        Turns <ul> or <ol> and their <li> children into list items, nested lists one level deeper.
+        """
+        ordered = element.name == 'ol'
+        for child in element.children:
+            if child.name == 'li':
+                # one item per <li>; nested lists and images inside it follow it
+                writer = RunWriter(lambda: self.add_text_block(blocks, {'type': 'list_item', 'ordered': ordered,
+                                                                        'level': level}))
+                writer.open()
+                item = writer.block
+                self.parse_inline(child, blocks, writer, list_level=level + 1)
+                if not item['runs']:  # e.g. an <li> holding only a nested list or an image
+                    del blocks[next(idx for idx, block in enumerate(blocks) if block is item)]
+            elif child.name in ('ul', 'ol'):  # nested list directly under a list (rare case)
+                self.parse_list(child, blocks, level=level + 1)
+
+    def parse_image(self, element, blocks):
+        src = element.get('src')
+        if src:
+            caption = element.get('title') or element.get('alt', '').strip()
+            blocks.append({'type': 'image', 'src': src, 'caption': caption})
+
+    def parse_table(self, element, blocks):
+        """
+        Blogger puts a captioned image in a table, with the caption shown under it in a
+        td.tr-caption cell; the images of such a table take that caption, and a caption
+        without an image becomes a paragraph. Other tables are containers.
+        """
+        if 'tr-caption-container' not in (element.get('class') or []):
+            self.parse_block(element, blocks)
+            return
+        start = len(blocks)
+        captions = []
+        self.parse_caption_cells(element, blocks, captions)
+        caption = " ".join(" ".join(captions).split())
+        if not caption:
+            return
+        images = [block for block in blocks[start:] if block['type'] == 'image']
+        for image in images:
+            image['caption'] = caption
+        if not images:
+            self.add_text_block(blocks, {'type': 'paragraph'})['runs'].append(caption)
+
+    def parse_caption_cells(self, element, blocks, captions):
+        # walks the rows of a caption table: caption cells give text, every other cell is a container
+        for child in element.children:
+            if child.name in ('thead', 'tbody', 'tfoot', 'tr'):
+                self.parse_caption_cells(child, blocks, captions)
+            elif child.name in ('td', 'th'):
+                if 'tr-caption' in (child.get('class') or []):
+                    captions.append(child.get_text())
+                else:
+                    self.parse_block(child, blocks)
+
+    def parse_iframe(self, element, blocks):
+        src = element.get('src')
+        if is_map_embed(src):
+            blocks.append({'type': 'map', 'src': src})
+
+    @staticmethod
+    def add_text_block(blocks, block):
+        block['runs'] = []
+        blocks.append(block)
+        return block
+
+    def parse_inline(self, element, blocks, writer, list_level=0):
+        """
+        Writes the inline content of element as runs through writer. A block-level element
+        (image, map, list, heading, paragraph) met along the way closes the current
+        text block and is added in place; text after it starts a new block.
+
+        :param list_level: Nesting level for lists met inside this element.
+        """
+        for child in element.children:
+            if child.name is None:
+                if isinstance(child, NavigableString) and not isinstance(child, PreformattedString):
+                    writer.write(WHITESPACE.sub(" ", child))  # collapse whitespace as a browser would
+            elif child.name == 'br':
+                if writer.block is not None:  # a break right after an image, map or list opens no paragraph
+                    writer.write("\n")
+            elif child.name == 'a' and not child.find(['img', 'iframe']):
+                writer.write_link(child.get_text(strip=True), child.get('href', ''))
+            elif child.name in ('ul', 'ol'):
+                writer.close()
+                self.parse_list(child, blocks, level=list_level)
+            elif child.name == 'p' and writer.block is not None and writer.block['type'] == 'list_item' \
+                    and not writer.block['runs']:
+                # <li><p>text</p></li>: the paragraph is the text of the item
+                self.parse_inline(child, blocks, writer, list_level)
+            elif child.name in BLOCK_HANDLERS:
+                writer.close()
+                handler = BLOCK_HANDLERS[child.name]
+                if handler:
+                    getattr(self, handler)(child, blocks)
+            else:  # spans, bold, italics, links around images ...
+                self.parse_inline(child, blocks, writer, list_level)
+
+
+class PostCache:
+    """
+    Parsed posts on disk, one JSON file per post version, plus an in-process copy so
+    a post used by several outputs in one run is read at most once.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: Directory holding the cached posts; None keeps them in memory only.
+        """
+        self.cache_dir = cache_dir
+        self._memory = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """Cache key of a post version, e.g. key(url, updated) or key(url, page_hash)."""
+        return fingerprint(IR_VERSION, *parts)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """The cached post, or None."""
+        if key in self._memory:
+            return self._memory[key]
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                ir = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cached post {key}: {e}")
+            return None
+        if ir.get('version') != IR_VERSION:
+            return None
+        self._memory[key] = ir
+        return ir
+
+    def put(self, key, ir):
+        self._memory[key] = ir
+        if not self.cache_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(ir, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logging.warning(f"Could not cache post {key}: {e}")
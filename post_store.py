@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from extract_blogs import iter_entries
+
+# tag:blogger.com,1999:blog-<blog id>.post-<post id>
+ATOM_POST_ID = re.compile(r"blog-(\d+)\.post-(\d+)$")
+ATOM_BLOG_ID = re.compile(r"blog-(\d+)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    blog_id TEXT,
+    url TEXT,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    author TEXT,
+    published TEXT,
+    updated TEXT,
+    labels TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS posts_published ON posts (published);
+CREATE INDEX IF NOT EXISTS posts_title ON posts (title);
+
+CREATE TABLE IF NOT EXISTS post_labels (
+    post_id TEXT NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    label TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (post_id, label)
+);
+CREATE INDEX IF NOT EXISTS post_labels_label ON post_labels (label, post_id);
+
+-- size and modification time of each export when it was last indexed
+CREATE TABLE IF NOT EXISTS backups (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+
+-- full-text index over title and body, kept in step with posts by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+    title, content, content='posts', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+    INSERT INTO posts_fts (rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+"""
+
+
+def normalize_timestamp(value) -> Optional[str]:
+    """
+    Converts an RFC 3339 timestamp from Blogger ('2024-07-21T10:03:00.003+01:00')
+    to UTC ('2024-07-21T09:03:00Z'), so stored timestamps compare as plain strings.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PostStore:
+    """
+    Local SQLite store of blog posts, filled from Blogger exports and API pulls, with
+    indexes on published date, labels and title and a full-text index on title and body.
+    Posts are only rewritten when their updated timestamp is newer than the stored one.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The SQLite database file (created if missing).
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def upsert(self, post) -> bool:
+        """
+        Inserts a post, or replaces the stored copy if this one was updated later.
+
+        :param post: Dict with id, blog_id, url, title, content, author, published, updated and labels.
+        :return: True if the store changed.
+        """
+        updated = normalize_timestamp(post.get('updated'))
+        cursor = self.db.execute(
+            """INSERT INTO posts (id, blog_id, url, title, content, author, published, updated, labels)
+               VALUES (:id, :blog_id, :url, :title, :content, :author, :published, :updated, :labels)
+               ON CONFLICT (id) DO UPDATE SET
+                   blog_id = excluded.blog_id, url = excluded.url, title = excluded.title,
+                   content = excluded.content, author = excluded.author, published = excluded.published,
+                   updated = excluded.updated, labels = excluded.labels
+               WHERE posts.updated IS NULL OR excluded.updated > posts.updated""",
+            {'id': post['id'],
+             'blog_id': post.get('blog_id'),
+             'url': post.get('url'),
+             'title': post.get('title') or "No Title",
+             'content': post.get('content') or "",
+             'author': post.get('author'),
+             'published': normalize_timestamp(post.get('published')),
+             'updated': updated,
+             'labels': json.dumps(post.get('labels') or [])})
+        if cursor.rowcount == 0:
+            return False
+
+        self.db.execute("DELETE FROM post_labels WHERE post_id = ?", (post['id'],))
+        self.db.executemany("INSERT OR IGNORE INTO post_labels (post_id, label) VALUES (?, ?)",
+                            [(post['id'], label) for label in post.get('labels') or []])
+        return True
+
+    def upsert_many(self, posts: Iterable[dict]) -> int:
+        """Upserts posts in one transaction; returns how many were new or changed."""
+        with self.db:
+            return sum(self.upsert(post) for post in posts)
+
+    def index_backup(self, xml_file, force=False) -> int:
+        """
+        Streams a Blogger export into the store, skipping comments, settings and the template.
+        An export whose size and modification time are unchanged since it was last indexed
+        is not read again.
+
+        :param force: Read the export even if it looks unchanged.
+        :return: Number of posts added or updated.
+        """
+        path = os.path.abspath(xml_file)
+        stat = os.stat(path)
+        if not force:
+            row = self.db.execute("SELECT size, mtime_ns FROM backups WHERE path = ?", (path,)).fetchone()
+            if row is not None and (row['size'], row['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                logging.info(f"Skipping {xml_file}: unchanged since it was last indexed")
+                return 0
+
+        def posts():
+            for entry in iter_entries(xml_file, blog_id_prefix=None, title_prefix=None):
+                match = ATOM_POST_ID.search(entry['id'])
+                if entry['kind'] == 'post' and match:
+                    yield dict(entry, blog_id=match.group(1), id=match.group(2))
+
+        changed = self.upsert_many(posts())
+        with self.db:
+            self.db.execute("""INSERT INTO backups (path, size, mtime_ns) VALUES (?, ?, ?)
+                               ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns""",
+                            (path, stat.st_size, stat.st_mtime_ns))
+        logging.info(f"Indexed {xml_file}: {changed} posts added or updated")
+        return changed
+
+    def index_api_posts(self, blog_id, posts: Iterable[dict]) -> int:
+        """
+        Stores posts as returned by the Blogger API (see TravelBlogExtractor.list_blog_posts).
+
+        :return: Number of posts added or updated.
+        """
+        return self.upsert_many(dict(post, blog_id=blog_id, author=(post.get('author') or {}).get('displayName'))
+                                for post in posts)
+
+    def last_updated(self, blog_id=None) -> Optional[str]:
+        """Latest updated timestamp (UTC) in the store, optionally for one blog."""
+        if blog_id is None:
+            row = self.db.execute("SELECT MAX(updated) FROM posts").fetchone()
+        else:
+            row = self.db.execute("SELECT MAX(updated) FROM posts WHERE blog_id = ?", (blog_id,)).fetchone()
+        return row[0]
+
+    def select(self, labels=None, start=None, end=None, title_prefix=None, search=None, blog_id=None,
+               limit=None) -> List[dict]:
+        """
+        Picks posts, oldest first, e.g. select(labels=['Botswana'], start='2024-07-01', end='2024-08-01').
+
+        :param labels: Only posts carrying every one of these labels (case-insensitive).
+        :param start: Only posts published at or after this date / timestamp.
+        :param end: Only posts published before this date / timestamp.
+        :param title_prefix: Only posts whose title starts with this.
+        :param search: FTS5 query over title and body, e.g. 'elephant NOT chobe'.
+        :param blog_id: Only posts of this blog.
+        :param limit: Maximum number of posts to return.
+        :return: Post dicts (id, blog_id, url, title, content, author, published, updated, labels).
+        """
+        clauses, params = [], []
+        for label in labels or []:
+            clauses.append("posts.id IN (SELECT post_id FROM post_labels WHERE label = ?)")
+            params.append(label)
+        if start:
+            clauses.append("posts.published >= ?")
+            params.append(normalize_timestamp(start) or start)
+        if end:
+            clauses.append("posts.published < ?")
+            params.append(normalize_timestamp(end) or end)
+        if title_prefix:
+            # a range on the indexed title column instead of LIKE, which could not use the index
+            clauses.append("posts.title >= ? AND posts.title < ?")
+            params.extend([title_prefix, title_prefix + "\U0010ffff"])
+        if search:
+            clauses.append("posts.rowid IN (SELECT rowid FROM posts_fts WHERE posts_fts MATCH ?)")
+            params.append(search)
+        if blog_id:
+            clauses.append("posts.blog_id = ?")
+            params.append(blog_id)
+
+        sql = "SELECT * FROM posts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY published"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [dict(row, labels=json.loads(row['labels'])) for row in self.db.execute(sql, params)]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,114 @@
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt
+
+# theme font references (minorHAnsi, majorEastAsia ...) take precedence over the plain
+# font attributes, so they are dropped wherever a font is set explicitly
+FONT_ATTRIBUTES = ('w:ascii', 'w:hAnsi', 'w:eastAsia', 'w:cs')
+THEME_FONT_ATTRIBUTES = ('w:asciiTheme', 'w:hAnsiTheme', 'w:eastAsiaTheme', 'w:cstheme')
+
+LIST_STYLES = ['List Bullet', 'List Bullet 2', 'List Bullet 3', 'List Bullet 4', 'List Bullet 5',
+               'List Number', 'List Number 2', 'List Number 3', 'List Number 4', 'List Number 5']
+FIGURE_STYLE = 'Figure'
+
+
+def set_fonts(rPr, font_name):
+    """Points a run-properties element (of a style or the document defaults) at font_name."""
+    rFonts = rPr.find(qn('w:rFonts'))
+    if rFonts is None:
+        rFonts = OxmlElement('w:rFonts')
+        rPr.insert(0, rFonts)  # rFonts comes first in rPr
+    for attribute in THEME_FONT_ATTRIBUTES:
+        rFonts.attrib.pop(qn(attribute), None)
+    for attribute in FONT_ATTRIBUTES:
+        rFonts.set(qn(attribute), font_name)
+
+
+class Typography:
+    """
+    Fonts and spacing of the generated documents, set once on the document styles
+    when a document is created, so paragraphs and runs carry no direct formatting
+    and the cost does not grow with the size of the document.
+    """
+
+    def __init__(self, font_name="Aptos", heading_font_name=None, body_spacing=(4, 4), list_spacing=(3, 3),
+                 caption_spacing=(0, 6), template_file=None):
+        """
+        :param font_name: Font of all text: body, lists, captions, tables, headers and footers.
+        :param heading_font_name: Font of headings and titles (defaults to font_name).
+        :param body_spacing: (before, after) spacing of body paragraphs and figures, in points.
+        :param list_spacing: (before, after) spacing of list items, in points.
+        :param caption_spacing: (before, after) spacing of image captions, in points.
+        :param template_file: Optional .docx whose styles, page setup, headers and footers are
+                              used as the starting point; the settings above are applied on top.
+        """
+        self.font_name = font_name
+        self.heading_font_name = heading_font_name or font_name
+        self.body_spacing = body_spacing
+        self.list_spacing = list_spacing
+        self.caption_spacing = caption_spacing
+        self.template_file = template_file
+
+    def settings(self):
+        """The options that change the output, e.g. for build fingerprints."""
+        return {'font_name': self.font_name,
+                'heading_font_name': self.heading_font_name,
+                'body_spacing': list(self.body_spacing),
+                'list_spacing': list(self.list_spacing),
+                'caption_spacing': list(self.caption_spacing),
+                'template_file': self.template_file}
+
+    def new_document(self):
+        """Creates an empty document (from the template, if any) with the typography applied."""
+        doc = Document(self.template_file)
+        self.apply(doc)
+        return doc
+
+    def apply(self, doc):
+        """Sets fonts and spacing on the styles of doc."""
+        styles = doc.styles.element
+        defaults = styles.find(qn('w:docDefaults'))
+        if defaults is None:
+            defaults = OxmlElement('w:docDefaults')
+            styles.insert(0, defaults)
+        rPrDefault = defaults.find(qn('w:rPrDefault'))
+        if rPrDefault is None:
+            rPrDefault = OxmlElement('w:rPrDefault')
+            defaults.insert(0, rPrDefault)
+        rPr = rPrDefault.find(qn('w:rPr'))
+        if rPr is None:
+            rPr = OxmlElement('w:rPr')
+            rPrDefault.append(rPr)
+        set_fonts(rPr, self.font_name)
+
+        # styles naming a font of their own (headings, titles, table styles ... in the default template)
+        for style in doc.styles:
+            is_heading = (style.name or '').startswith(('Heading', 'Title', 'Subtitle'))
+            for rFonts in list(style.element.iter(qn('w:rFonts'))):
+                set_fonts(rFonts.getparent(), self.heading_font_name if is_heading else self.font_name)
+
+        self.set_spacing(doc.styles['Body Text'], self.body_spacing)
+        for name in LIST_STYLES:
+            if name in doc.styles:  # the default template stops at List Bullet 3 / List Number 3
+                self.set_spacing(doc.styles[name], self.list_spacing)
+        caption = doc.styles['Caption']
+        self.set_spacing(caption, self.caption_spacing)
+        caption.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+        if FIGURE_STYLE not in doc.styles:
+            figure = doc.styles.add_style(FIGURE_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+            figure.base_style = doc.styles['Body Text']
+            figure.next_paragraph_style = doc.styles['Body Text']
+        figure = doc.styles[FIGURE_STYLE]
+        self.set_spacing(figure, self.body_spacing)
+        figure.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        return doc
+
+    @staticmethod
+    def set_spacing(style, spacing):
+        before, after = spacing
+        style.paragraph_format.space_before = Pt(before)
+        style.paragraph_format.space_after = Pt(after)